@@ -1,183 +1,645 @@
 import logging
-from qdrant_client import QdrantClient
 import os
-from qdrant_client.http.models import PointStruct, VectorParams, Distance
-from sentence_transformers import SentenceTransformer
 from PyPDF2 import PdfReader
+import numpy as np
 import uuid
 import json
+import hashlib
+import threading
+import time
+import multiprocessing
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from cache_utils import EmbeddingCache
+from metrics import dependency_span
+from content_store import ContentStore
+from embedding_backends import EMBEDDING_MODEL, make_embedding_backend
+from vector_store import BulkWriter, SearchHit, make_vector_store
+from lexical_index import BM25Index
+from dedup import ChunkDeduplicator
+from chunking import (
+    CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, iter_text_chunks, iter_transcript_chunks, iter_page_chunks
+)
+
+# "torch" (default) or "onnx" for the int8-quantized export; see embedding_backends.py
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join("models", f"{EMBEDDING_MODEL}-onnx"))
+
+# "qdrant" (default) or "numpy" to keep small per-request corpora in process; see vector_store.py
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+
+# "full" keeps chunk text in every payload and float32 vectors; "compact" moves text to the local
+# content store (payloads carry a text_id) and stores vectors at VECTOR_PRECISION
+STORAGE_MODE = os.getenv("STORAGE_MODE", "full")
+VECTOR_PRECISION = os.getenv("VECTOR_PRECISION", "int8")
+# Rescore the top quantized candidates against full-precision vectors. Unset, this is on for Qdrant (which keeps
+# the originals on disk) and off for the NumPy store, where it keeps a float32 copy of every vector in memory
+VECTOR_RESCORE = os.getenv("VECTOR_RESCORE")
+CONTENT_STORE_PATH = os.getenv("CONTENT_STORE_PATH", os.path.join("cache", "content"))
+
+# Number of chunks sent through the embedding model per forward pass.
+# Larger batches amortize per-call overhead on CPU-only hosts.
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", 64))
+
+# Token-based chunk sizing; see chunking.py
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", CHUNK_MAX_TOKENS))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", CHUNK_OVERLAP_TOKENS))
+
+# On-disk embedding cache, shared across requests and restarts
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("cache", "embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200_000))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Points are scoped per request; scopes that were never cleaned up expire after this many seconds
+SCOPE_TTL_SECONDS = int(os.getenv("SCOPE_TTL_SECONDS", 6 * 3600))
+SCOPE_GC_INTERVAL_SECONDS = int(os.getenv("SCOPE_GC_INTERVAL_SECONDS", 600))
+
+# Buffered bulk upserts: flush every UPSERT_BATCH_SIZE points or UPSERT_MAX_BYTES, whichever comes first
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 256))
+UPSERT_MAX_BYTES = int(os.getenv("UPSERT_MAX_BYTES", 4 * 1024 * 1024))
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", 2))
+
+# Retrieval: "hybrid" (BM25 + dense, fused), "dense" or "lexical"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates fetched from each ranker per requested result before fusion
+FUSION_CANDIDATES = 4
+RRF_K = 60
+
+# Folder ingestion: text extraction worker processes, and the manifest of already-indexed files
+PDF_INGEST_WORKERS = int(os.getenv("PDF_INGEST_WORKERS", os.cpu_count() or 1))
+PDF_MANIFEST_FILE = ".pdf_manifest.json"
+
+
+def extract_pdf_pages(pdf_path):
+    """
+    Extract the text of every page of a PDF.
+    Module-level so it can run in a worker process.
+    """
+    reader = PdfReader(pdf_path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Fuse ranked hit lists by summing 1 / (k + rank) per point.
+    Returns SearchHits ordered by fused score.
+    """
+    scores = {}
+    payloads = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            scores[hit.id] = scores.get(hit.id, 0.0) + 1.0 / (k + rank)
+            payloads.setdefault(hit.id, hit.payload)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [SearchHit(point_id, score, payloads[point_id]) for point_id, score in ranked]
+
+
+def load_manifest(manifest_path):
+    """
+    Load the folder manifest: {"scopes": {scope: {"files": {filename: {"size", "mtime", "sha256"}}, "updated_at"}}},
+    with "" as the key of the unscoped index. A manifest written before scopes were tracked holds unscoped files.
+    """
+    try:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return {"scopes": {}}
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {"scopes": {}}
+    if "scopes" not in manifest:
+        manifest = {"scopes": {"": {"files": manifest, "updated_at": time.time()}}}
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, manifest_path)
+
 
 class RAGKBProcessor:
-    def __init__(self, collection_name="knowledge_base", recreate_collection=True):
+    def __init__(self, collection_name="knowledge_base", recreate_collection=True, encode_batch_size=ENCODE_BATCH_SIZE,
+                 use_embedding_cache=True, chunk_max_tokens=CHUNK_MAX_TOKENS, chunk_overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                 vector_backend=VECTOR_BACKEND, embedding_backend=EMBEDDING_BACKEND, retrieval_mode=RETRIEVAL_MODE,
+                 storage_mode=STORAGE_MODE):
         self.collection_name = collection_name
-        self.qdrant_client = QdrantClient(url="http://localhost:6333")  # Connect to Qdrant
-        self.st_model = SentenceTransformer('all-MiniLM-L6-v2')  # Pre-trained model
+        self.chunk_max_tokens = chunk_max_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+
+        # Compact storage: chunk text lives in a local content store and vectors are stored quantized
+        self.storage_mode = storage_mode
+        self.content_store = None
+        precision = "float32"
+        if storage_mode == "compact":
+            self.content_store = ContentStore(CONTENT_STORE_PATH)
+            precision = VECTOR_PRECISION
+        elif storage_mode != "full":
+            raise ValueError(f"Unknown storage mode: {storage_mode}")
+        self.vector_store = make_vector_store(
+            vector_backend, collection_name, precision=precision,
+            rescore=None if VECTOR_RESCORE is None else VECTOR_RESCORE == "1"
+        )
+        self.writer = BulkWriter(
+            self.vector_store, batch_size=UPSERT_BATCH_SIZE, max_bytes=UPSERT_MAX_BYTES, workers=UPSERT_WORKERS
+        )
+
+        # Lexical index kept next to the vector store for keyword queries like "NDA"
+        self.lexical_index = BM25Index()
+        self.retrieval_mode = retrieval_mode
+
+        # Per-scope chunk deduplication: scope -> (ChunkDeduplicator, created_at)
+        self._deduplicators = {}
+        self._dedup_lock = threading.Lock()
+        self.embedder = make_embedding_backend(embedding_backend, EMBEDDING_MODEL, ONNX_MODEL_DIR)
+        self.vector_size = self.embedder.dimension
+        self.encode_batch_size = encode_batch_size
+
+        # Skip re-embedding text we have already seen (same reports, retried webhooks).
+        # Keyed by backend name so ONNX and PyTorch vectors never mix.
+        self.embedding_cache = None
+        if use_embedding_cache:
+            self.embedding_cache = EmbeddingCache(
+                EMBEDDING_CACHE_PATH,
+                model_name=self.embedder.name,
+                max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                max_bytes=EMBEDDING_CACHE_MAX_BYTES,
+            )
+
+        self._gc_thread = None
+
+        # Embeddings of fixed queries, computed once by precompute_queries
+        self.query_vectors = {}
 
-        # Recreate the collection every time the server starts
+        # A clean start drops every point; processes sharing the collection keep it and only create it if missing
         if recreate_collection:
-            self.reset_collection()  # Ensures clean start
+            self.reset_collection()
         else:
-            logging.warning(f"Using existing collection: {self.collection_name}")
+            self.vector_store.ensure(self.vector_size)
 
     def reset_collection(self):
         """
-        Delete and recreate the Qdrant collection to clear previous data.
-        This ensures no data carryover between requests.
+        Delete and recreate the collection to clear previous data.
+        Requests are isolated by scope, so this is only needed on a clean start.
+        """
+        self.writer.flush(all_scopes=True)
+        self.vector_store.recreate(self.vector_size)
+        self.lexical_index.clear()
+
+    def scope_payload(self, scope, ttl=SCOPE_TTL_SECONDS):
+        """
+        Payload fields that tie a point to a request scope.
+        """
+        if scope is None:
+            return {}
+        return {"scope": scope, "expires_at": time.time() + ttl}
+
+    def delete_scope(self, scope):
+        """
+        Remove every point indexed under scope.
         """
         try:
-            # Delete existing collection
-            self.qdrant_client.delete_collection(collection_name=self.collection_name)
-            logging.info(f"Deleted existing collection: {self.collection_name}")
+            try:
+                self.writer.flush(scope)  # Points still in flight would otherwise outlive the delete
+            except Exception as e:
+                logging.warning(f"Writes to scope {scope} failed before its deletion: {e}")
+            self.vector_store.delete_scope(scope)
+            self.lexical_index.remove_scope(scope)
+            with self._dedup_lock:
+                self._deduplicators.pop(scope, None)
+            logging.info(f"Deleted scope: {scope}")
         except Exception as e:
-            logging.warning(f"Collection {self.collection_name} does not exist. Proceeding to create it.")
-
-        # Recreate the collection
-        self.qdrant_client.recreate_collection(
-            collection_name=self.collection_name,
-            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
-        )
-        logging.info(f"Recreated collection: {self.collection_name}")
+            logging.error(f"Error deleting scope {scope}: {e}")
 
-    def vectorize_data(self, data, source, metadata):
+    def collect_expired_scopes(self):
         """
-        Vectorize text data and add it to Qdrant.
+        Remove points whose scope has outlived its TTL (e.g. requests that crashed before cleanup).
         """
         try:
-            points = []
-            chunks = self.chunk_text(data)  # Split text into smaller chunks
-
-            for i, chunk in enumerate(chunks):
-                # Encode the chunk and add it to Qdrant
-                embedding = self.st_model.encode(chunk).tolist()
-                points.append(PointStruct(
-                    id=i,
-                    vector=embedding,
-                    payload={"text": chunk, "source": source, "metadata": metadata}
-                ))
-
-            # Insert points into Qdrant
-            self.qdrant_client.upsert(collection_name=self.collection_name, points=points)
-            logging.info(f"Data vectorized successfully with {len(points)} chunks.")
+            self.vector_store.delete_expired()
+            self.lexical_index.remove_expired()
+            with self._dedup_lock:
+                cutoff = time.time() - SCOPE_TTL_SECONDS
+                for scope, (_, created_at) in list(self._deduplicators.items()):
+                    if created_at < cutoff:
+                        del self._deduplicators[scope]
         except Exception as e:
-            logging.error(f"Error vectorizing data: {e}")
+            logging.error(f"Error collecting expired scopes: {e}")
 
-    def search_context(self, query, top_k=3):
+    def start_scope_gc(self, interval=SCOPE_GC_INTERVAL_SECONDS):
         """
-        Search for similar contexts in Qdrant based on query.
+        Start a daemon thread that periodically removes expired scopes.
+        """
+        if self._gc_thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.collect_expired_scopes()
+
+        self._gc_thread = threading.Thread(target=run, name="scope-gc", daemon=True)
+        self._gc_thread.start()
+
+    def vectorize_data(self, data, source, metadata, scope=None):
+        """
+        Vectorize text data and add it to the vector store.
         """
         try:
-            # Encode query text into embeddings
-            query_vector = self.st_model.encode(query).tolist()
-
-            # Search Qdrant
-            results = self.qdrant_client.search(
-                collection_name=self.collection_name,
-                query_vector=query_vector,
-                limit=top_k,
-            )
-            return [res.payload for res in results]
+            items = ((chunk, {"source": source, "metadata": metadata}) for chunk in self.iter_chunks(data))
+            count = self.index_chunks(items, scope=scope)
+            logging.info(f"Data vectorized successfully with {count} chunks.")
         except Exception as e:
-            logging.error(f"Error searching context: {e}")
-            return []
+            logging.error(f"Error vectorizing data: {e}")
+
+    def deduplicator(self, scope):
+        """
+        Return the deduplicator shared by every ingestion call in scope.
+        """
+        with self._dedup_lock:
+            if scope not in self._deduplicators:
+                self._deduplicators[scope] = (ChunkDeduplicator(), time.time())
+            return self._deduplicators[scope][0]
+
+    def dedup_report(self, scope):
+        """Chunks seen, duplicates dropped and encodes saved so far in scope."""
+        with self._dedup_lock:
+            entry = self._deduplicators.get(scope)
+        return entry[0].report() if entry else ChunkDeduplicator().report()
+
+    def iter_unique(self, items, scope, deduplicator):
+        """
+        Build payloads for (chunk, payload fields) items and drop duplicates before they reach the model.
+        Yields (point id, payload) for the chunks that survive.
+        """
+        scope_fields = self.scope_payload(scope)
+        for chunk, fields in items:
+            point_id = str(uuid.uuid4())
+            payload = {"text": chunk, **fields, **scope_fields}
+            provenance = {"source": fields.get("source"), "metadata": fields.get("metadata")}
+            if deduplicator.add(point_id, payload, provenance):
+                yield point_id, payload
+
+    def index_chunks(self, items, scope=None):
+        """
+        Deduplicate, embed and queue (chunk, payload fields) items for upsert, one batch at a time.
+        Chunks are deduplicated across the whole scope, or within this call when there is no scope.
+        Returns the number of points indexed.
+        """
+        deduplicator = self.deduplicator(scope) if scope is not None else ChunkDeduplicator()
+        unique = self.iter_unique(items, scope, deduplicator)
+
+        count = 0
+        for batch, embeddings in self.iter_encoded_batches(unique, text=lambda item: item[1]["text"]):
+            points = [
+                {"id": point_id, "vector": embedding, "payload": payload}
+                for (point_id, payload), embedding in zip(batch, embeddings)
+            ]
+            # Queue points for bulk upsert while the next batch is encoded
+            self.add_points(points)
+            count += len(points)
+
+        if scope is None:
+            self.flush_provenance(deduplicator)
+        return count
+
+    def flush_provenance(self, deduplicator, scope=None):
+        """
+        Write provenance gained by points that were already handed to an upsert when their duplicates arrived,
+        in one batched request. Survivors still in the writer buffer share their payload dict with the
+        deduplicator, so they are upserted with the updated provenance and skipped here.
+        """
+        dirty = deduplicator.pop_dirty()
+        if not dirty:
+            return
+        buffered = self.writer.buffered_ids(scope)
+        updates = {
+            point_id: {"provenance": provenance} for point_id, provenance in dirty.items() if point_id not in buffered
+        }
+        if not updates:
+            return
+        self.writer.flush(scope)
+        self.vector_store.set_payloads(updates)
+
+    def add_points(self, points):
+        """
+        Queue points for bulk upsert and add their text to the lexical index.
+        In compact mode the text is moved to the content store and the payload keeps its text_id.
+        """
+        for point in points:
+            self.lexical_index.add(point["id"], point["payload"].get("text") or "", point["payload"])
+        if self.content_store is not None:
+            payloads = [point["payload"] for point in points if "text" in point["payload"]]
+            text_ids = self.content_store.put_texts([payload.pop("text") or "" for payload in payloads])
+            for payload, text_id in zip(payloads, text_ids):
+                payload["text_id"] = text_id
+        self.writer.add(points)
+
+    def delete_by_field(self, field, value, scope=None):
+        """
+        Remove every point of scope (the unscoped points when None) whose payload field equals value.
+        """
+        self.writer.flush(all_scopes=True)
+        self.vector_store.delete_by_field(field, value, scope)
+        self.lexical_index.remove_by_field(field, value, scope)
+
+    def iter_encoded_batches(self, items, batch_size=None, text=None):
+        """
+        Consume items lazily and yield (batch, vectors) pairs of at most batch_size items.
+        text extracts the chunk text from an item; by default items are the chunk strings.
+        """
+        batch_size = batch_size or self.encode_batch_size
+        items = iter(items)
+        while True:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                return
+            texts = batch if text is None else [text(item) for item in batch]
+            yield batch, self.encode_chunks(texts, batch_size=batch_size)
+
+    def encode_chunks(self, chunks, batch_size=None):
+        """
+        Encode a list of chunks in batches, serving repeated text from the embedding cache.
+        Returns a contiguous float32 array of shape (len(chunks), vector_size).
+        """
+        batch_size = batch_size or self.encode_batch_size
+        chunks = list(chunks)
+        vectors = np.empty((len(chunks), self.vector_size), dtype=np.float32)
+
+        # Fill cached vectors first and only run the model on the misses
+        cached = self.embedding_cache.get_many(chunks) if self.embedding_cache else {}
+        for i, vector in cached.items():
+            vectors[i] = vector
+        missing = [i for i in range(len(chunks)) if i not in cached]
 
-    def chunk_text(self, text, chunk_size=500):
+        for start in range(0, len(missing), batch_size):
+            indices = missing[start:start + batch_size]
+            batch = [chunks[i] for i in indices]
+            with dependency_span("embedding", "encode"):
+                encoded = self.embedder.encode(batch, batch_size=batch_size)
+            vectors[indices] = encoded
+            if self.embedding_cache:
+                self.embedding_cache.set_many(batch, encoded)
+        return vectors
+
+    def embedding_cache_stats(self):
+        """Return hit/miss counters of the embedding cache."""
+        if not self.embedding_cache:
+            return {"enabled": False}
+        return {"enabled": True, **self.embedding_cache.stats()}
+
+    def iter_chunks(self, text):
+        """
+        Lazily split text into overlapping chunks on speaker turn, paragraph and sentence boundaries.
+        """
+        return iter_text_chunks(text, self.chunk_max_tokens, self.chunk_overlap_tokens)
+
+    def chunk_text(self, text):
         """
         Split text into smaller chunks for processing.
         """
-        chunks = []
-        for i in range(0, len(text), chunk_size):
-            chunks.append(text[i:i + chunk_size])
-        return chunks
+        return list(self.iter_chunks(text))
 
-    def process_transcripts(self, transcripts):
-        """Processes JSON transcripts and stores chunks in the Qdrant collection."""
+    def process_transcripts(self, transcripts, scope=None):
+        """Processes JSON transcripts and stores chunks in the vector store."""
         for transcript in transcripts:
-            text = json.dumps(transcript, indent=2)
-            chunks = self.chunk_text(text)
-            self.all_chunks.extend(chunks)  # Collect chunks for TF-IDF
-
-            # Prepare points for Qdrant
-            points = []
-            for chunk_id, chunk in enumerate(chunks):
-                embedding = self.st_model.encode(chunk).tolist()
-                points.append(
-                    PointStruct(
-                        id=str(uuid.uuid4()),
-                        vector=embedding,
-                        payload={
-                            "text": chunk,
-                            "chunk_id": chunk_id,
-                            "source": "transcripts",
-                            "metadata": {
-                                "id": transcript["id"],
-                                "title": transcript["title"],
-                                "date": transcript["date"],
-                                "attendees": [att["email"] for att in transcript.get("meeting_attendees", [])],
-                            }
-                        }
-                    )
-                )
-
-            # Upload points to Qdrant
-            self.qdrant_client.upsert(collection_name=self.collection_name, points=points)
-            # print(f"Processed {len(chunks)} chunks for transcript ID {transcript['id']}")
-
-    def process_pdfs_in_folder(self, folder_path):
-        """Processes all PDFs in a folder and stores chunks in the Qdrant collection."""
-        for filename in os.listdir(folder_path):
-            if filename.endswith(".pdf"):
-                pdf_path = os.path.join(folder_path, filename)
-                self.process_pdf(pdf_path)
-
-    def process_pdf(self, pdf_path):
-        """Processes a single PDF file and stores chunks in the Qdrant collection."""
-        reader = PdfReader(pdf_path)
-        for page_number, page in enumerate(reader.pages):
-            text = page.extract_text()
-            if not text.strip():  # Skip empty pages
+            if transcript.get("sentences"):
+                chunks = iter_transcript_chunks(transcript, self.chunk_max_tokens, self.chunk_overlap_tokens)
+            else:
+                chunks = self.iter_chunks(json.dumps(transcript, indent=2))
+
+            metadata = {
+                "id": transcript["id"],
+                "title": transcript["title"],
+                "date": transcript["date"],
+                "attendees": [att["email"] for att in transcript.get("meeting_attendees", [])],
+            }
+            items = (
+                (chunk, {"chunk_id": chunk_id, "source": "transcripts", "metadata": metadata})
+                for chunk_id, chunk in enumerate(chunks)
+            )
+            self.index_chunks(items, scope=scope)
+            # print(f"Processed chunks for transcript ID {transcript['id']}")
+
+    def process_pdfs_in_folder(self, folder_path, scope=None, workers=PDF_INGEST_WORKERS, manifest_path=None):
+        """
+        Incrementally processes the PDFs in a folder and stores chunks in the vector store.
+        Only new or changed files are re-extracted and re-embedded, using a per-scope manifest of size/mtime/hash.
+        Text extraction runs in a process pool; points of deleted or changed files are removed.
+        """
+        manifest_path = manifest_path or os.path.join(folder_path, PDF_MANIFEST_FILE)
+        manifest = load_manifest(manifest_path)
+        scope_key = "" if scope is None else str(scope)
+        indexed = manifest["scopes"].get(scope_key, {}).get("files", {})
+        self.writer.flush(scope, all_scopes=True)  # Counts and deletes below must see every queued point
+        current = {}
+        pending = []
+
+        for filename in sorted(os.listdir(folder_path)):
+            if not filename.endswith(".pdf"):
                 continue
-            chunks = self.chunk_text(text)
-            self.all_chunks.extend(chunks)  # Collect chunks for TF-IDF
-
-            # Prepare points for Qdrant
-            points = []
-            for chunk_id, chunk in enumerate(chunks):
-                embedding = self.st_model.encode(chunk).tolist()
-                points.append(
-                    PointStruct(
-                        id=str(uuid.uuid4()),
-                        vector=embedding,
-                        payload={
-                            "text": chunk,
-                            "chunk_id": chunk_id,
-                            "source": "pdf",
-                            "metadata": {
-                                "pdf_name": os.path.basename(pdf_path),
-                                "page": page_number + 1,
-                            }
-                        }
-                    )
-                )
-
-            # Upload points to Qdrant
-            self.qdrant_client.upsert(collection_name=self.collection_name, points=points)
-        # print(f"Processed PDF: {os.path.basename(pdf_path)}")
+            pdf_path = os.path.join(folder_path, filename)
+            document = os.path.abspath(pdf_path)
+            stat = os.stat(pdf_path)
+            entry = indexed.get(filename)
+
+            # Only hash files whose size or mtime moved
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                digest = entry["sha256"]
+            else:
+                digest = file_sha256(pdf_path)
+            current[filename] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest}
+
+            # Unchanged and still indexed (the collection may have been recreated since)
+            if entry and entry["sha256"] == digest and self.vector_store.count_by_field("document", document, scope):
+                continue
+            # Stale points of a changed file, or partial points left by an earlier failed ingest
+            self.delete_by_field("document", document, scope)
+            pending.append(filename)
 
-    def search_context(self, query, top_k=3):
-        """Searches the knowledge base for relevant chunks based on a query."""
-        query_vector = self.st_model.encode(query).tolist()
-        results = self.qdrant_client.search(
-            collection_name=self.collection_name,
-            query_vector=query_vector,
-            limit=top_k,
+        deleted = [filename for filename in indexed if filename not in current]
+        for filename in deleted:
+            self.delete_by_field("document", os.path.abspath(os.path.join(folder_path, filename)), scope)
+            logging.info(f"Removed points of deleted PDF: {filename}")
+
+        failed = []
+
+        def ingest_failed(filename, error):
+            # Drop whatever part of the file was already indexed so a retry starts clean
+            logging.error(f"Error processing PDF {filename}: {error}")
+            failed.append(filename)
+            self.delete_by_field("document", os.path.abspath(os.path.join(folder_path, filename)), scope)
+
+        if workers > 1 and len(pending) > 1:
+            # Extract in worker processes; embed each file here as soon as its text is ready. Spawned, not forked:
+            # this process runs the worker pool, upsert and model threads whose locks a fork would copy mid-use.
+            # Spawned workers re-import the main module as __mp_main__, which must not start services then (phase2 checks)
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(pending)), mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                futures = {
+                    executor.submit(extract_pdf_pages, os.path.join(folder_path, filename)): filename
+                    for filename in pending
+                }
+                for future in as_completed(futures):
+                    filename = futures[future]
+                    try:
+                        self.process_pdf(os.path.join(folder_path, filename), scope=scope, pages=future.result())
+                    except Exception as e:
+                        ingest_failed(filename, e)
+        else:
+            for filename in pending:
+                try:
+                    self.process_pdf(os.path.join(folder_path, filename), scope=scope)
+                except Exception as e:
+                    ingest_failed(filename, e)
+
+        # Failed files stay out of the manifest so they are retried next time
+        self.writer.flush(scope)
+        for filename in failed:
+            del current[filename]
+        # Entries of expired scopes go with their points; the unscoped index never expires
+        cutoff = time.time() - SCOPE_TTL_SECONDS
+        manifest["scopes"] = {
+            key: value for key, value in manifest["scopes"].items() if key == "" or value["updated_at"] >= cutoff
+        }
+        manifest["scopes"][scope_key] = {"files": current, "updated_at": time.time()}
+        save_manifest(manifest_path, manifest)
+        logging.info(
+            f"Indexed {len(pending) - len(failed)} new or changed PDFs, skipped {len(current) - len(pending) + len(failed)} "
+            f"unchanged, removed {len(deleted)} deleted, {len(failed)} failed."
         )
 
+    def process_pdf(self, pdf_path, scope=None, pages=None):
+        """
+        Processes a single PDF file and stores chunks in the vector store.
+        pages may hold already-extracted page texts (e.g. from a worker process).
+        """
+        if pages is None:
+            # Pages are extracted lazily and chunks never cross a page boundary
+            reader = PdfReader(pdf_path)
+            pages = (page.extract_text() for page in reader.pages)
+        chunks = iter_page_chunks(pages, self.chunk_max_tokens, self.chunk_overlap_tokens)
+
+        document = os.path.abspath(pdf_path)
+        pdf_name = os.path.basename(pdf_path)
+
+        def items():
+            chunk_ids = {}
+            for page_number, chunk in chunks:
+                chunk_id = chunk_ids.get(page_number, 0)
+                chunk_ids[page_number] = chunk_id + 1
+                yield chunk, {
+                    "chunk_id": chunk_id,
+                    "source": "pdf",
+                    "document": document,
+                    "metadata": {
+                        "pdf_name": pdf_name,
+                        "page": page_number,
+                    },
+                }
+
+        self.index_chunks(items(), scope=scope)
+        # print(f"Processed PDF: {os.path.basename(pdf_path)}")
+
+    def precompute_queries(self, queries):
+        """
+        Encode fixed queries once so later searches skip the model.
+        """
+        queries = [query for query in dict.fromkeys(queries) if query not in self.query_vectors]
+        if queries:
+            for query, vector in zip(queries, self.encode_chunks(queries)):
+                self.query_vectors[query] = vector
+            logging.info(f"Precomputed {len(queries)} query vectors.")
+
+    def query_vector(self, query):
+        """Return the embedding of query, using the precomputed vector when there is one."""
+        vector = self.query_vectors.get(query)
+        if vector is None:
+            vector = self.encode_chunks([query])[0]
+        return vector
+
+    def flush(self, scope=None):
+        """
+        Barrier: wait until every queued point (and provenance update) of scope is stored. Called before searching.
+        Without a scope (a search over everything), every scope's queued points are waited for as well, but only
+        unscoped provenance is written and only unscoped upsert errors are raised; other scopes' errors and
+        provenance stay with the requests that own them.
+        """
+        with self._dedup_lock:
+            entry = self._deduplicators.get(scope)
+        if entry is not None:
+            self.flush_provenance(entry[0], scope)
+        with dependency_span("vector_store", "flush"):
+            self.writer.flush(scope, all_scopes=scope is None)
+
+    def search_context(self, query, top_k=3, scope=None, mode=None):
+        """Searches the knowledge base for relevant chunks based on a query, restricted to scope if given."""
+        return self.search_contexts([query], top_k, scope=scope, mode=mode)[query]
+
+    def search_contexts(self, queries, top_k=3, scope=None, mode=None):
+        """
+        Run several queries with a single batched vector search.
+        Returns a dict of query -> list of contexts, in the same shape as search_context.
+
+        In "hybrid" mode dense and BM25 rankings are fused with reciprocal rank fusion.
+        A query whose exact terms already appear in top_k chunks is answered lexically and skips the dense search.
+        """
+        mode = mode or self.retrieval_mode
+        self.flush(scope)
+        queries = list(dict.fromkeys(queries))
+        candidates = top_k * FUSION_CANDIDATES
+
+        lexical = {}
+        if mode != "dense":
+            lexical = {query: self.lexical_index.search(query, candidates, scope=scope) for query in queries}
+
+        results = {}
+        dense_queries = []
+        for query in queries:
+            if mode == "lexical":
+                results[query] = self.to_contexts(lexical[query][:top_k])
+                continue
+            if mode == "hybrid":
+                exact = [hit for hit in lexical[query] if hit.exact]
+                if len(exact) >= top_k:
+                    results[query] = self.to_contexts(exact[:top_k])
+                    continue
+            dense_queries.append(query)
+
+        if dense_queries:
+            limit = top_k if mode == "dense" else candidates
+            vectors = [self.query_vector(query) for query in dense_queries]
+            with dependency_span("vector_store", "search"):
+                batch_results = self.vector_store.search_batch(vectors, limit, scope=scope)
+            for query, hits in zip(dense_queries, batch_results):
+                if mode == "hybrid":
+                    hits = reciprocal_rank_fusion([hits, lexical[query]])
+                results[query] = self.to_contexts(hits[:top_k])
+        return results
+
+    def to_contexts(self, results):
+        """Convert search hits into the context dicts returned by the search methods."""
+        texts = {}
+        if self.content_store is not None:
+            texts = self.content_store.get_texts(
+                {result.payload["text_id"] for result in results if "text_id" in result.payload}
+            )
         contexts = []
         for result in results:
             payload = result.payload
             contexts.append({
                 "score": result.score,
-                "text": payload.get("text"),
+                "text": payload.get("text", texts.get(payload.get("text_id"))),
                 "source": payload.get("source"),
                 "metadata": payload.get("metadata"),
             })
@@ -0,0 +1,128 @@
+"""
+Compare the PyTorch and int8-quantized ONNX embedding backends.
+Checks cosine parity of the ONNX vectors against PyTorch, then measures encoding throughput.
+
+Each backend is loaded and measured in its own subprocess: peak RSS is a high-water mark, so
+measuring both in one process would attribute the first backend's peak to the second.
+
+Usage:
+    python embedding_backends.py                        # export the ONNX model once
+    python -m benchmarks.embedding_backends [--chunks 512] [--batch-sizes 16 64] [--threshold 0.99]
+
+Exits non-zero if the parity check fails.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from embedding_backends import (
+    EMBEDDING_MODEL, OnnxEmbeddingBackend, SentenceTransformerBackend, compare_vectors
+)
+
+BACKENDS = ["torch", "onnx"]
+PARITY_CHUNKS = 128
+WORDS = (
+    "investor nda data room agreement report revenue growth meeting follow up documents send "
+    "deck pipeline quarter funding round valuation diligence schedule call next steps signature"
+).split()
+
+
+def make_chunks(count, rng, words_per_chunk=120):
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_chunk)) for _ in range(count)]
+
+
+def peak_memory_mb():
+    """Peak RSS of this process in MB (VmHWM, which unlike ru_maxrss is not carried over from the parent)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return float("nan")
+
+
+def throughput(backend, chunks, batch_size):
+    backend.encode(chunks[:batch_size], batch_size=batch_size)  # Warm up
+    start = time.perf_counter()
+    backend.encode(chunks, batch_size=batch_size)
+    return len(chunks) / (time.perf_counter() - start)
+
+
+def measure_backend(args):
+    """Worker mode: load one backend, save its parity vectors and print its measurements as JSON."""
+    chunks = make_chunks(args.chunks, random.Random(0))
+    if args.worker == "torch":
+        backend = SentenceTransformerBackend(EMBEDDING_MODEL)
+    else:
+        backend = OnnxEmbeddingBackend(args.model_dir, EMBEDDING_MODEL)
+    loaded_mb = peak_memory_mb()
+
+    np.save(args.vectors, backend.encode(chunks[:PARITY_CHUNKS], batch_size=64))
+    result = {
+        "loaded_mb": loaded_mb,
+        "throughput": {str(batch_size): throughput(backend, chunks, batch_size) for batch_size in args.batch_sizes},
+    }
+    result["peak_mb"] = peak_memory_mb()
+    print(json.dumps(result))
+
+
+def run_backend(name, args, vectors_path):
+    command = [
+        sys.executable, "-m", "benchmarks.embedding_backends", "--worker", name, "--vectors", vectors_path,
+        "--model-dir", args.model_dir, "--chunks", str(args.chunks), "--batch-sizes", *map(str, args.batch_sizes),
+    ]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default=os.path.join("models", f"{EMBEDDING_MODEL}-onnx"))
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--threshold", type=float, default=0.99)
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        measure_backend(args)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        results, vectors = {}, {}
+        for name in BACKENDS:
+            vectors_path = os.path.join(directory, f"{name}.npy")
+            results[name] = run_backend(name, args, vectors_path)
+            vectors[name] = np.load(vectors_path)
+            print(f"{name} loaded, peak RSS {results[name]['loaded_mb']:.0f} MB "
+                  f"({results[name]['peak_mb']:.0f} MB after encoding)")
+
+    parity = compare_vectors(vectors["torch"], vectors["onnx"], threshold=args.threshold)
+    print(f"parity: min cosine {parity['min_cosine']:.4f}, mean {parity['mean_cosine']:.4f} "
+          f"(threshold {parity['threshold']}) -> {'PASS' if parity['passed'] else 'FAIL'}")
+
+    print(f"\n{'backend':<8} {'batch':>6} {'chunks/s':>10}")
+    for batch_size in args.batch_sizes:
+        for name in BACKENDS:
+            print(f"{name:<8} {batch_size:>6} {results[name]['throughput'][str(batch_size)]:>10.1f}")
+
+    if not parity["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Local fake of the OpenAI chat completions API, and a load test of llm_client against it.
+
+The fake enforces its own requests/tokens per minute and answers over-limit requests with
+429 and Retry-After, like the real API, so the client's limiter and backoff can be exercised
+without an account.
+
+Usage:
+    python -m benchmarks.fake_openai serve [--port 8089] [--rpm 60] [--tpm 20000] [--latency 0.2]
+    python -m benchmarks.fake_openai load [--requests 60] [--concurrency 8] [--rpm 60] [--tpm 20000]
+
+"load" starts the fake in-process and sends concurrent requests twice: once with the
+client-side limiter off and once with it set to the fake's limits, reporting 429s, retries
+and wall time for each.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "YES. The text mentions it."
+# JSON mode replies (detect_flows): every flow mentioned
+JSON_REPLY = json.dumps({
+    flow: {"mentioned": True, "reasoning": REPLY, "scenario": "None", "reason": "", "quote": ""}
+    for flow in ("nda", "dataroom", "prenda")
+})
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server answering POST /v1/chat/completions with canned replies after latency seconds.
+    A fraction error_rate of admitted requests fail with 500.
+    """
+
+    def __init__(self, port=0, rpm=60, tpm=20_000, latency=0.2, error_rate=0.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0}
+        self._window = deque()  # (timestamp, tokens) of accepted requests in the last minute
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+
+    def _admit(self, tokens):
+        """Return None if the request fits this minute's limits, else the seconds until it would."""
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            while self._window and now - self._window[0][0] >= 60:
+                self._window.popleft()
+            used = sum(window_tokens for _, window_tokens in self._window)
+            if len(self._window) < self.rpm and used + tokens <= self.tpm:
+                self._window.append((now, tokens))
+                return None
+            self.stats["rate_limited"] += 1
+            return 60 - (now - self._window[0][0]) if self._window else 1.0
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "Not found"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompt_tokens = sum(len(message.get("content") or "") for message in request["messages"]) // 4
+                completion_tokens = min(request.get("max_tokens") or 50, 50)
+
+                retry_after = server._admit(prompt_tokens + completion_tokens)
+                if retry_after is not None:
+                    self._send(
+                        429,
+                        {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                        {"Retry-After": f"{retry_after:.2f}"},
+                    )
+                    return
+                if random.random() < server.error_rate:
+                    with server._lock:
+                        server.stats["errors"] += 1
+                    self._send(500, {"error": {"message": "Internal error"}})
+                    return
+
+                time.sleep(server.latency)
+                json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+                self._send(200, {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": JSON_REPLY if json_mode else REPLY},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def run_load(server, requests, concurrency, limiter):
+    import llm_client
+
+    llm_client.rate_limiter = limiter
+    for name in llm_client.client_stats:
+        llm_client.client_stats[name] = 0
+    server.stats.update(requests=0, rate_limited=0, errors=0)
+
+    messages = [{"role": "user", "content": "Does this text mention an NDA? " + "lorem ipsum " * 150}]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(llm_client.create_completion, "gpt-4o", messages, max_tokens=50)
+            for _ in range(requests)
+        ]
+        failures = sum(1 for future in futures if future.exception() is not None)
+    return time.perf_counter() - start, failures, llm_client.llm_client_stats(), dict(server.stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--rpm", type=int, default=60)
+    parser.add_argument("--tpm", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = FakeOpenAIServer(args.port, args.rpm, args.tpm, args.latency, args.error_rate)
+        print(f"Fake OpenAI API at {server.base_url} (set OPENAI_BASE_URL to use it)")
+        server.httpd.serve_forever()
+        return
+
+    server = FakeOpenAIServer(0, args.rpm, args.tpm, args.latency, args.error_rate).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ.setdefault("LLM_BACKOFF_MAX_SECONDS", "5")
+    from llm_client import RateLimiter
+
+    print(f"{'limiter':<10} {'seconds':>8} {'failed':>7} {'429s':>6} {'retries':>8} {'throttled s':>12}")
+    runs = [("off", RateLimiter(10 ** 9, 10 ** 9)), ("on", RateLimiter(args.rpm, args.tpm))]
+    for index, (name, limiter) in enumerate(runs):
+        if index:
+            time.sleep(60)  # let the fake's one-minute window drain between runs
+        seconds, failures, client, fake = run_load(server, args.requests, args.concurrency, limiter)
+        print(
+            f"{name:<10} {seconds:>8.1f} {failures:>7} {fake['rate_limited']:>6} "
+            f"{client['retries']:>8} {client['throttled_seconds']:>12.1f}"
+        )
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Microbenchmarks of the RAGKBProcessor and transcript hot paths, saved as JSON so runs can be compared.
+
+Groups:
+    chunking     chunk_text on 1k, 10k and 100k word texts
+    encoding     encode_chunks one chunk at a time vs one batched call (embedding cache off)
+    search       search_context at several corpus sizes and top_k (NumPy store, random vectors)
+    pdf          process_pdf on synthetic multi-page PDFs, including embedding and upsert
+    transcript   CompactTranscript, process_transcript_content and get_transcript_speakers on a
+                 10k-sentence transcript
+
+Usage:
+    python -m benchmarks.micro run [--only chunking search] [--repeats 5] [--output micro.json]
+    python -m benchmarks.micro compare baseline.json micro.json [--threshold 0.10]
+
+"compare" lists the median time of each benchmark in both runs and exits non-zero if any is
+slower than the baseline by more than the threshold (a fraction, 0.10 = 10%).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+GROUPS = ["chunking", "encoding", "search", "pdf", "transcript"]
+WORDS = (
+    "investor nda data room agreement report revenue growth meeting follow up documents send "
+    "deck pipeline quarter funding round valuation diligence schedule call next steps signature"
+).split()
+SPEAKERS = [f"Speaker {i}" for i in range(8)]
+QUERIES = ["NDA or Non-Disclosure Agreement", "data room or dataroom", "supporting documents or more information"]
+
+
+def make_text(words, rng):
+    """Paragraphs of sentences of random words, with speaker turns like a rendered transcript."""
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(8, 30))
+        sentences.append(f"{rng.choice(SPEAKERS)}: " + " ".join(rng.choice(WORDS) for _ in range(length)) + ".")
+        words -= length
+    return "\n\n".join(" ".join(sentences[i:i + 4]) for i in range(0, len(sentences), 4))
+
+
+def make_transcript(sentences, rng):
+    return {
+        "id": "benchmark",
+        "title": "Benchmark X Investor",
+        "sentences": [
+            {"speaker_name": rng.choice(SPEAKERS), "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))}
+            for _ in range(sentences)
+        ],
+    }
+
+
+def make_pdf(path, pages, rng, words_per_page=400):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_font("Arial", size=11)
+    for _ in range(pages):
+        pdf.add_page()
+        pdf.multi_cell(0, 6, txt=make_text(words_per_page, rng))
+    pdf.output(path)
+
+
+def measure(fn, repeats, teardown=None):
+    """Run fn once to warm up, then repeats times; returns timing statistics in seconds."""
+    times = []
+    for run in range(repeats + 1):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if teardown is not None:
+            teardown()
+        if run:
+            times.append(elapsed)
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "mean": statistics.mean(times),
+        "repeats": repeats,
+    }
+
+
+def make_processor():
+    from RAG import RAGKBProcessor
+
+    return RAGKBProcessor(collection_name="benchmark_micro", vector_backend="numpy", use_embedding_cache=False)
+
+
+def bench_chunking(processor, rng, args):
+    for words in (1_000, 10_000, 100_000):
+        text = make_text(words, rng)
+        yield f"chunk_text[words={words}]", lambda: processor.chunk_text(text), None
+
+
+def bench_encoding(processor, rng, args):
+    chunks = processor.chunk_text(make_text(args.encode_chunks * 150, rng))[:args.encode_chunks]
+
+    def per_chunk():
+        for chunk in chunks:
+            processor.encode_chunks([chunk])
+
+    yield f"encode_per_chunk[chunks={len(chunks)}]", per_chunk, None
+    yield f"encode_batched[chunks={len(chunks)}]", lambda: processor.encode_chunks(chunks), None
+
+
+def bench_search(processor, rng, args):
+    # Random unit vectors stand in for embeddings, so large corpora don't need the model
+    vector_rng = np.random.default_rng(args.seed)
+    processor.precompute_queries(QUERIES)
+    for size in args.corpus_sizes:
+        scope = uuid.uuid4().hex
+        vectors = vector_rng.standard_normal((size, processor.vector_size)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        scope_fields = processor.scope_payload(scope)
+        processor.add_points([
+            {"id": str(uuid.uuid4()), "vector": vector,
+             "payload": {"text": make_text(120, rng), "source": "benchmark", **scope_fields}}
+            for vector in vectors
+        ])
+        processor.flush()
+        for top_k in args.top_k:
+            yield (
+                f"search_context[corpus={size},top_k={top_k},mode={processor.retrieval_mode}]",
+                lambda: [processor.search_context(query, top_k, scope=scope) for query in QUERIES],
+                None,
+            )
+        processor.delete_scope(scope)
+
+
+def bench_pdf(processor, rng, args):
+    directory = tempfile.mkdtemp(prefix="micro-pdf-")
+    for pages in args.pdf_pages:
+        path = os.path.join(directory, f"synthetic-{pages}.pdf")
+        make_pdf(path, pages, rng)
+        scope = uuid.uuid4().hex
+
+        def run():
+            processor.process_pdf(path, scope=scope)
+            processor.flush()
+
+        yield f"process_pdf[pages={pages}]", run, lambda: processor.delete_scope(scope)
+
+
+def bench_transcript(processor, rng, args):
+    from transcript_utils import CompactTranscript, get_transcript_speakers, process_transcript_content
+
+    transcript = make_transcript(args.sentences, rng)
+    yield f"compact_transcript[sentences={args.sentences}]", lambda: CompactTranscript.from_fireflies(transcript), None
+    yield f"process_transcript_content[sentences={args.sentences}]", lambda: process_transcript_content(transcript), None
+    yield f"get_transcript_speakers[sentences={args.sentences}]", lambda: get_transcript_speakers(transcript), None
+
+
+BENCHMARKS = {
+    "chunking": bench_chunking,
+    "encoding": bench_encoding,
+    "search": bench_search,
+    "pdf": bench_pdf,
+    "transcript": bench_transcript,
+}
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    needs_processor = set(args.only) - {"transcript"}
+    processor = make_processor() if needs_processor else None
+
+    results = {}
+    print(f"{'benchmark':<60} {'median ms':>10} {'min ms':>10}")
+    for group in args.only:
+        for name, fn, teardown in BENCHMARKS[group](processor, rng, args):
+            results[name] = measure(fn, args.repeats, teardown)
+            print(f"{name:<60} {results[name]['median'] * 1000:>10.2f} {results[name]['min'] * 1000:>10.2f}")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": {name: value for name, value in vars(args).items() if name != "func"},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved to {args.output}")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'benchmark':<60} {'base ms':>10} {'new ms':>10} {'change':>8}")
+    for name in sorted(set(baseline) | set(current)):
+        if name not in baseline or name not in current:
+            print(f"{name:<60} {'only in ' + ('baseline' if name in baseline else 'current'):>30}")
+            continue
+        before, after = baseline[name]["median"], current[name]["median"]
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "  faster"
+        print(f"{name:<60} {before * 1000:>10.2f} {after * 1000:>10.2f} {change:>+8.1%}{flag}")
+
+    if regressions:
+        print(f"\n{regressions} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--only", nargs="+", choices=GROUPS, default=GROUPS)
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument("--output", help="write the results as JSON to this file")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--encode-chunks", type=int, default=64)
+    run_parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    run_parser.add_argument("--top-k", type=int, nargs="+", default=[3, 8, 24])
+    run_parser.add_argument("--pdf-pages", type=int, nargs="+", default=[10, 50])
+    run_parser.add_argument("--sentences", type=int, default=10_000)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Measure what compact storage costs in recall and saves in memory.
+
+Indexes a synthetic corpus at float32, float16 and int8 (with and without full-precision
+rescoring) in the NumPy store, and reports recall@k against exact float32 search plus
+bytes per point for the vectors and payloads of "full" versus "compact" storage.
+
+Usage:
+    python -m benchmarks.quantization [--size 5000] [--queries 200] [--top-k 3 10]
+"""
+import argparse
+import json
+import uuid
+
+import numpy as np
+
+from vector_store import NumpyVectorStore
+
+VECTOR_SIZE = 384
+# Roughly one 200-token chunk
+CHUNK_CHARS = 1100
+
+
+def make_corpus(size, rng, clusters=50):
+    """Clustered unit vectors, closer to sentence embeddings than isotropic noise."""
+    centers = rng.standard_normal((clusters, VECTOR_SIZE)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=size)] + 0.6 * rng.standard_normal((size, VECTOR_SIZE)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_points(vectors, scope):
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "vector": vector,
+            "payload": {
+                "text": f"chunk {i} " + "x" * CHUNK_CHARS,
+                "source": "Investor Report",
+                "metadata": {"meeting_id": "benchmark", "title": "Quarterly update"},
+                "scope": scope,
+                "expires_at": 0.0,
+            },
+        }
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def recall_at_k(reference, candidate):
+    return np.mean([
+        len({hit.id for hit in expected} & {hit.id for hit in actual}) / max(len(expected), 1)
+        for expected, actual in zip(reference, candidate)
+    ])
+
+
+def payload_bytes(points, compact):
+    total = 0
+    for point in points:
+        payload = dict(point["payload"])
+        if compact:
+            payload["text_id"] = "0" * 64
+            del payload["text"]
+        total += len(json.dumps(payload))
+    return total / len(points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 10])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_corpus(args.size, rng)
+    queries = make_corpus(args.queries, rng)
+    points = make_points(vectors, "benchmark")
+
+    configurations = [
+        ("float32", NumpyVectorStore("benchmark", precision="float32")),
+        ("float16", NumpyVectorStore("benchmark", precision="float16")),
+        ("int8", NumpyVectorStore("benchmark", precision="int8")),
+        ("int8+rescore", NumpyVectorStore("benchmark", precision="int8", rescore=True)),
+    ]
+    for _, store in configurations:
+        store.upsert(points)
+
+    exact = configurations[0][1]
+    header = "".join(f"{f'recall@{k}':>11}" for k in args.top_k)
+    print(f"{'precision':<14}{header}{'vector B/pt':>13}")
+    for name, store in configurations:
+        recalls = "".join(
+            f"{recall_at_k(exact.search_batch(queries, k), store.search_batch(queries, k)):>11.3f}"
+            for k in args.top_k
+        )
+        print(f"{name:<14}{recalls}{store.memory_bytes() / args.size:>13.0f}")
+
+    # Compact int8 is the NumPy default; rescoring adds an in-memory float32 copy of every vector
+    full = exact.memory_bytes() / args.size + payload_bytes(points, compact=False)
+    print(f"\nIn-store bytes per point: full {full:.0f}")
+    for name, store in configurations[2:]:
+        compact = store.memory_bytes() / args.size + payload_bytes(points, compact=True)
+        print(f"  compact ({name}) {compact:.0f} ({full / compact:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+End-to-end replay of Fireflies webhooks through handle_webhook, with every external service faked.
+
+Fireflies (access token, transcript), the meetings database, the investor report host, Outlook and
+the vector store are replaced by in-process fakes that sleep for a configurable latency and fail
+at a configurable rate; OpenAI is the local fake API from benchmarks.fake_openai. Embedding and
+everything else run for real, and caches live in a temporary directory.
+
+Each payload is posted to the webhook and timed until its job finishes. This is repeated at each
+concurrency level (concurrent submitters, with JOB_WORKERS set to the highest level), reporting
+throughput and p50/p95/p99 job latency, then the slowest stages from the jobs' spans.
+
+Usage:
+    python -m benchmarks.replay [--payloads webhooks.jsonl] [--jobs 40] [--concurrency 1 2 4 8]
+                                [--latency 0.05] [--openai-latency 0.3] [--error-rate 0.0]
+                                [--openai-error-rate 0.0] [--output replay.json]
+
+--payloads is a JSON lines file of webhook bodies ({"meetingId": ..., "eventType": ...}, plus an
+optional "user"); without it synthetic meetings are generated. Meeting IDs get a per-run suffix
+so the idempotent webhook never returns a stored result.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+EVENT_TYPE = "Transcription completed"
+SPEAKERS = ["Kyle", "Dana Whitfield", "Marco Ruiz"]
+WORDS = (
+    "investor nda data room agreement report revenue growth meeting follow up documents send "
+    "deck pipeline quarter funding round valuation diligence schedule call next steps signature"
+).split()
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class FakeService:
+    """
+    Stand-in for an external service: wrapped calls sleep for about latency seconds
+    (uniformly jittered by +-50%) and raise ConnectionError at error_rate.
+    """
+
+    def __init__(self, name, latency, error_rate, rng):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = rng
+        self.stats = {"calls": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def wrap(self, fn):
+        def call(*args, **kwargs):
+            with self._lock:
+                self.stats["calls"] += 1
+                delay = self.latency * self.rng.uniform(0.5, 1.5)
+                failed = self.rng.random() < self.error_rate
+                if failed:
+                    self.stats["errors"] += 1
+            time.sleep(delay)
+            if failed:
+                raise ConnectionError(f"{self.name}: injected failure")
+            return fn(*args, **kwargs)
+
+        return call
+
+
+def fake_transcript(meeting_id, sentences):
+    """A Fireflies transcript whose text is seeded by meeting_id, so every meeting embeds differently."""
+    rng = random.Random(meeting_id)
+    base = meeting_id.rsplit("-r", 1)[0]
+    # Half the titles match the investor-client format and skip the GPT triage call
+    title = f"Replay {base} X Investor" if rng.random() < 0.5 else f"Replay {base} sync"
+    return {
+        "id": meeting_id,
+        "title": title,
+        "date": "2025-01-01",
+        "meeting_attendees": [{"email": f"{speaker.split()[0].lower()}@example.com"} for speaker in SPEAKERS],
+        "sentences": [
+            {"speaker_name": SPEAKERS[i % len(SPEAKERS)], "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))}
+            for i in range(sentences)
+        ],
+    }
+
+
+def fake_meeting_lookup(title):
+    rng = random.Random(title)
+    return {
+        "meeting_details": {"title": title, "scheduled_time": "2025-01-01 10:00:00"},
+        "notes": [" ".join(rng.choice(WORDS) for _ in range(40)) for _ in range(3)],
+        "investor_report": f"https://reports.example.com/{title.replace(' ', '_')}.pdf",
+    }
+
+
+def fake_report_pages(url):
+    rng = random.Random(url)
+    return ["\n".join(" ".join(rng.choice(WORDS) for _ in range(60)) for _ in range(10)) + "\n" for _ in range(3)]
+
+
+def install_fakes(phase2, latency, error_rate, sentences, seed):
+    """Patch the external calls made by phase2 and return the fakes by name."""
+    rng = random.Random(seed)
+    fakes = {name: FakeService(name, latency, error_rate, rng)
+             for name in ("fireflies", "mysql", "report_host", "outlook", "vector_store")}
+
+    phase2.get_access_token = fakes["fireflies"].wrap(lambda endpoint: "fake")
+    phase2.fetch_transcript_details = fakes["fireflies"].wrap(lambda meeting_id, api_key: fake_transcript(meeting_id, sentences))
+    phase2.get_meeting_details_and_notes_by_fuzzy_title = fakes["mysql"].wrap(fake_meeting_lookup)
+    phase2.report_fetcher.fetch_pages = fakes["report_host"].wrap(fake_report_pages)
+    phase2.get_access_token_outlook = fakes["outlook"].wrap(lambda: "fake")
+    phase2.send_email = fakes["outlook"].wrap(lambda token, recipient_email, subject, body: None)
+
+    # The NumPy store keeps the points in process; its remote calls get the network latency of Qdrant
+    store = phase2.rag_processor.vector_store
+    for method in ("upsert", "search_batch", "delete_scope", "set_payloads"):
+        setattr(store, method, fakes["vector_store"].wrap(getattr(store, method)))
+    return fakes
+
+
+def load_payloads(path, count):
+    if path is None:
+        return [{"meetingId": f"meeting{i}", "eventType": EVENT_TYPE} for i in range(count)]
+    with open(path) as f:
+        payloads = [json.loads(line) for line in f if line.strip()]
+    return [payloads[i % len(payloads)] for i in range(count)]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values (q in 0-100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def submit_and_wait(client, phase2, user, payload, poll):
+    """Post one webhook and wait for its job; returns (seconds, job)."""
+    start = time.perf_counter()
+    response = client.post(f"/{user}/fireflies", json=payload)
+    body = response.get_json()
+    if response.status_code != 202:
+        raise RuntimeError(f"Webhook returned {response.status_code}: {body}")
+    while True:
+        job = phase2.job_queue.get(body["job_id"])
+        if job["status"] in TERMINAL_STATUSES:
+            return time.perf_counter() - start, job
+        time.sleep(poll)
+
+
+def run_level(phase2, payloads, concurrency, run, poll):
+    """Replay payloads with concurrency submitters; returns the level summary and the finished jobs."""
+    local = threading.local()
+
+    def replay(index_payload):
+        index, payload = index_payload
+        if not hasattr(local, "client"):
+            local.client = phase2.app.test_client()
+        payload = {**payload, "meetingId": f"{payload['meetingId']}-r{run}.{index}"}
+        payload.setdefault("eventType", EVENT_TYPE)
+        user = payload.pop("user", "kyle")
+        return submit_and_wait(local.client, phase2, user, payload, poll)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(replay, enumerate(payloads)))
+    wall = time.perf_counter() - start
+
+    latencies = [seconds for seconds, _ in outcomes]
+    jobs = [job for _, job in outcomes]
+    summary = {
+        "concurrency": concurrency,
+        "jobs": len(jobs),
+        "failed": sum(1 for job in jobs if job["status"] == "failed"),
+        "seconds": round(wall, 3),
+        "jobs_per_second": round(len(jobs) / wall, 3),
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+    }
+    return summary, jobs
+
+
+def stage_summary(jobs):
+    """p50/p95 and total seconds per span name across the jobs' results, slowest total first."""
+    seconds = defaultdict(list)
+    for job in jobs:
+        for recorded in (job["result"] or {}).get("spans", []):
+            seconds[f"{recorded['kind']}:{recorded['name']}"].append(recorded["seconds"])
+    rows = [
+        {"span": name, "count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+         "total": round(sum(values), 3)}
+        for name, values in seconds.items()
+    ]
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", help="JSON lines file of webhook bodies")
+    parser.add_argument("--jobs", type=int, default=40, help="jobs per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per call to the faked services")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=10_000, help="OpenAI limits, both client-side and in the fake")
+    parser.add_argument("--tpm", type=int, default=10_000_000)
+    parser.add_argument("--sentences", type=int, default=120, help="sentences per fake transcript")
+    parser.add_argument("--detection-mode", choices=["multi", "consolidated"])
+    parser.add_argument("--poll", type=float, default=0.01, help="seconds between job status checks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(0, args.rpm, args.tpm, args.openai_latency, args.openai_error_rate).start()
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    # Read by phase2 and the modules it imports, so set before importing it
+    os.environ.update({
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_RPM": str(args.rpm),
+        "OPENAI_TPM": str(args.tpm),
+        "VECTOR_BACKEND": "numpy",
+        "JOB_WORKERS": str(max(args.concurrency)),
+        "LLM_CACHE_ENABLED": "0",
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+        "REPORT_CACHE_PATH": os.path.join(workdir, "reports.sqlite3"),
+        "CONTENT_STORE_PATH": os.path.join(workdir, "content"),
+        "PDF_ARCHIVE_DIR": os.path.join(workdir, "transcripts"),
+    })
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    if args.detection_mode:
+        os.environ["DETECTION_MODE"] = args.detection_mode
+    import phase2
+
+    fakes = install_fakes(phase2, args.latency, args.error_rate, args.sentences, args.seed)
+    payloads = load_payloads(args.payloads, args.jobs)
+    print(f"Replaying {len(payloads)} webhooks per level, job workers {max(args.concurrency)}, work dir {workdir}")
+
+    levels, all_jobs = [], []
+    print(f"{'concurrency':>11} {'jobs':>5} {'failed':>7} {'jobs/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}")
+    for run, concurrency in enumerate(args.concurrency):
+        summary, jobs = run_level(phase2, payloads, concurrency, run, args.poll)
+        levels.append(summary)
+        all_jobs.extend(jobs)
+        print(
+            f"{concurrency:>11} {summary['jobs']:>5} {summary['failed']:>7} {summary['jobs_per_second']:>8.2f} "
+            f"{summary['p50']:>8.2f} {summary['p95']:>8.2f} {summary['p99']:>8.2f}"
+        )
+
+    stages = stage_summary(all_jobs)
+    print(f"\n{'span':<40} {'count':>6} {'p50 s':>8} {'p95 s':>8} {'total s':>9}")
+    for row in stages[:15]:
+        print(f"{row['span']:<40} {row['count']:>6} {row['p50']:>8.3f} {row['p95']:>8.3f} {row['total']:>9.1f}")
+
+    calls = {name: fake.stats for name, fake in fakes.items()}
+    calls["openai"] = dict(server.stats)
+    print("\nFake service calls:", json.dumps(calls))
+    server.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "levels": levels, "stages": stages, "calls": calls}, f, indent=2)
+    if any(summary["failed"] for summary in levels) and not (args.error_rate or args.openai_error_rate):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
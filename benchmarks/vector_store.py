@@ -0,0 +1,93 @@
+"""
+Compare the Qdrant and in-process NumPy vector stores on a per-webhook workload:
+index a corpus of N chunks under one scope, then run the flow queries against it.
+
+Usage:
+    python -m benchmarks.vector_store [--sizes 100 1000 10000] [--queries 3] [--top-k 3]
+
+Qdrant is skipped if it isn't reachable at localhost:6333.
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+
+from vector_store import NumpyVectorStore, QdrantVectorStore
+
+VECTOR_SIZE = 384
+UPSERT_BATCH_SIZE = 64
+
+
+def make_points(count, scope, rng):
+    vectors = rng.standard_normal((count, VECTOR_SIZE)).astype(np.float32)
+    return [
+        {"id": str(uuid.uuid4()), "vector": vector, "payload": {"text": f"chunk {i}", "scope": scope}}
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def run(store, size, queries, top_k, rng, repeats):
+    """Return (upsert seconds, search seconds) for one corpus of size points, best of repeats."""
+    store.recreate(VECTOR_SIZE)
+    best_upsert, best_search = float("inf"), float("inf")
+    for _ in range(repeats):
+        scope = uuid.uuid4().hex
+        points = make_points(size, scope, rng)
+        query_vectors = rng.standard_normal((queries, VECTOR_SIZE)).astype(np.float32)
+
+        start = time.perf_counter()
+        for i in range(0, len(points), UPSERT_BATCH_SIZE):
+            store.upsert(points[i:i + UPSERT_BATCH_SIZE])
+        upserted = time.perf_counter()
+        store.search_batch(query_vectors, top_k, scope=scope)
+        searched = time.perf_counter()
+
+        store.delete_scope(scope)
+        best_upsert = min(best_upsert, upserted - start)
+        best_search = min(best_search, searched - upserted)
+    return best_upsert, best_search
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000, 5000, 20000, 100000])
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    stores = {"numpy": NumpyVectorStore("benchmark_vector_store")}
+    try:
+        qdrant = QdrantVectorStore("benchmark_vector_store")
+        qdrant.client.get_collections()
+        stores["qdrant"] = qdrant
+    except Exception as e:
+        print(f"Skipping qdrant: {e}")
+
+    print(f"{'backend':<8} {'size':>8} {'upsert ms':>10} {'search ms':>10} {'total ms':>10}")
+    totals = {}
+    for size in args.sizes:
+        for name, store in stores.items():
+            upsert, search = run(store, size, args.queries, args.top_k, rng, args.repeats)
+            totals[name, size] = upsert + search
+            print(f"{name:<8} {size:>8} {upsert * 1000:>10.2f} {search * 1000:>10.2f} {(upsert + search) * 1000:>10.2f}")
+
+    if len(stores) == 2:
+        winners = {size: min(stores, key=lambda name: totals[name, size]) for size in args.sizes}
+        print("\nFastest backend per corpus size:")
+        for size, winner in winners.items():
+            print(f"  {size:>8}: {winner}")
+        crossover = next((size for size in args.sizes if winners[size] == "qdrant"), None)
+        if crossover is None:
+            print("NumPy wins at every measured size.")
+        else:
+            print(f"Qdrant starts winning at {crossover} points.")
+
+    if "qdrant" in stores:
+        stores["qdrant"].client.delete_collection(collection_name="benchmark_vector_store")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+class DiskCache:
+    """
+    Size-bounded key/value store on local disk backed by SQLite.
+    Entries are evicted least-recently-used first once max_entries or max_bytes is exceeded.
+    """
+
+    def __init__(self, path, max_entries=100_000, max_bytes=512 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        # Entry count and byte total are kept in a one-row table by triggers, in the same transaction as the write,
+        # so bounds checks don't scan the table. REPLACE only fires the delete trigger with recursive_triggers on.
+        self._conn.execute("PRAGMA recursive_triggers = ON")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                entries INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("INSERT OR IGNORE INTO stats SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM entries")
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+                UPDATE stats SET entries = entries + 1, bytes = bytes + NEW.size;
+            END
+        """)
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+                UPDATE stats SET entries = entries - 1, bytes = bytes - OLD.size;
+            END
+        """)
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN
+                UPDATE stats SET bytes = bytes - OLD.size + NEW.size;
+            END
+        """)
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Return a dict of key -> value for every key found in the cache."""
+        if not keys:
+            return {}
+
+        now = time.time()
+        found = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # Stay well below SQLite's host parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created_at FROM entries WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl is not None and now - created_at > self.ttl:
+                        continue
+                    found[key] = value
+
+            expired = [key for key in unique_keys if key not in found]
+            if found:
+                self._conn.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE key = ?", [(now, key) for key in found]
+                )
+            if self.ttl is not None and expired:
+                self._conn.executemany(
+                    "DELETE FROM entries WHERE key = ? AND created_at < ?", [(key, now - self.ttl) for key in expired]
+                )
+            self._conn.commit()
+
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def set(self, key, value):
+        """Store value (bytes) under key."""
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        """Store every key -> value pair in items, then evict if the cache is over its bounds."""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, value, len(value), now, now) for key, value in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _size(self):
+        return self._conn.execute("SELECT entries, bytes FROM stats").fetchone()
+
+    def _evict(self):
+        count, total_bytes = self._size()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            total_bytes -= size
+
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        logging.info(f"Evicted {len(evicted)} entries from cache {self.path}")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current size of the cache."""
+        with self._lock:
+            count, total_bytes = self._size()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": count,
+                "bytes": total_bytes,
+            }
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embedding vectors, keyed by a hash of the model name and chunk text.
+    """
+
+    def __init__(self, path, model_name, max_entries=200_000, max_bytes=512 * 1024 * 1024):
+        self.model_name = model_name
+        self.store = DiskCache(path, max_entries=max_entries, max_bytes=max_bytes)
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts):
+        """Return a dict of index -> cached vector for every text found in the cache."""
+        keys = [self.key(text) for text in texts]
+        found = self.store.get_many(keys)
+        return {
+            i: np.frombuffer(found[key], dtype=np.float32)
+            for i, key in enumerate(keys)
+            if key in found
+        }
+
+    def set_many(self, texts, vectors):
+        self.store.set_many({
+            self.key(text): np.asarray(vector, dtype=np.float32).tobytes()
+            for text, vector in zip(texts, vectors)
+        })
+
+    def stats(self):
+        return self.store.stats()
@@ -0,0 +1,171 @@
+import re
+from collections import deque
+
+# Default chunk sizes, in tokens. all-MiniLM-L6-v2 truncates input at 256 word pieces.
+CHUNK_MAX_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 40
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+PARAGRAPH_BOUNDARY = re.compile(r"\n\s*\n")
+SPEAKER_PREFIX = re.compile(r"^([^:\n]{1,80}):\s")
+
+
+def count_tokens(text):
+    """
+    Approximate token count (words and punctuation), close to the model's word-piece count.
+    """
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def split_sentences(text):
+    """
+    Yield the sentences of text.
+    """
+    for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+        if sentence:
+            yield sentence
+
+
+def split_oversized(text, max_tokens, count_tokens=count_tokens, speaker_turn=False):
+    """
+    Break a unit that is larger than max_tokens into line-sized pieces, splitting lines that are
+    still too large into sentences, and sentences into words.
+    For a speaker turn the leading "Speaker: " label is repeated on every piece so attribution is not lost;
+    in other text (reports, PDF pages) a leading "Title: " line is just text.
+    """
+    prefix = ""
+    if speaker_turn:
+        match = SPEAKER_PREFIX.match(text)
+        if match:
+            prefix = match.group(0)
+            text = text[len(prefix):]
+    budget = max(max_tokens - count_tokens(prefix), 1)
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if count_tokens(line) <= budget:
+            yield prefix + line
+            continue
+        for sentence in split_sentences(line):
+            if count_tokens(sentence) <= budget:
+                yield prefix + sentence
+                continue
+            words = []
+            used = 0
+            for word in sentence.split():
+                tokens = count_tokens(word)
+                if words and used + tokens > budget:
+                    yield prefix + " ".join(words)
+                    words, used = [], 0
+                words.append(word)
+                used += tokens
+            if words:
+                yield prefix + " ".join(words)
+
+
+def pack_units(units, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, count_tokens=count_tokens,
+               speaker_turns=False):
+    """
+    Lazily pack text units (speaker turns, paragraphs, sentences) into chunks of at most max_tokens.
+    Units are never cut unless a single unit is larger than max_tokens.
+    Each chunk starts with up to overlap_tokens worth of trailing units from the previous chunk.
+    speaker_turns marks the units as "Speaker: text" turns, whose label is kept on every piece of a cut turn.
+    """
+    window = deque()  # (unit, tokens)
+    window_tokens = 0
+    fresh = False  # Whether the window holds units not yet emitted
+
+    for unit in units:
+        unit = unit.strip()
+        if not unit:
+            continue
+        tokens = count_tokens(unit)
+        pieces = [(unit, tokens)]
+        if tokens > max_tokens:
+            pieces = [
+                (piece, count_tokens(piece))
+                for piece in split_oversized(unit, max_tokens, count_tokens, speaker_turn=speaker_turns)
+            ]
+
+        for piece, piece_tokens in pieces:
+            if window and window_tokens + piece_tokens > max_tokens:
+                if fresh:
+                    yield "\n".join(text for text, _ in window)
+                    # Carry the tail of this chunk into the next one
+                    carried = 0
+                    kept = deque()
+                    while window and carried + window[-1][1] <= overlap_tokens:
+                        kept.appendleft(window.pop())
+                        carried += kept[0][1]
+                    window, window_tokens = kept, carried
+                    fresh = False
+                # Drop overlap from the front if the new piece still doesn't fit
+                while window and window_tokens + piece_tokens > max_tokens:
+                    window_tokens -= window.popleft()[1]
+
+            window.append((piece, piece_tokens))
+            window_tokens += piece_tokens
+            fresh = True
+
+    if window and fresh:
+        yield "\n".join(text for text, _ in window)
+
+
+def iter_text_units(text):
+    """
+    Yield paragraph-level units of text.
+    process_transcript_content renders one "Speaker: text" turn per paragraph, so turns stay whole.
+    """
+    for paragraph in PARAGRAPH_BOUNDARY.split(text):
+        if paragraph.strip():
+            yield paragraph
+
+
+def iter_text_chunks(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, count_tokens=count_tokens):
+    """
+    Chunk free text on paragraph and sentence boundaries.
+    """
+    return pack_units(iter_text_units(text), max_tokens, overlap_tokens, count_tokens)
+
+
+def iter_speaker_turns(sentences):
+    """
+    Merge consecutive Fireflies sentences by the same speaker into "Speaker: text" turns.
+    """
+    speaker, texts = None, []
+    for sentence in sentences:
+        name = sentence.get('speaker_name', 'Unknown Speaker')
+        if texts and name != speaker:
+            yield f"{speaker}: {' '.join(texts)}"
+            texts = []
+        speaker = name
+        texts.append(sentence.get('text', ''))
+    if texts:
+        yield f"{speaker}: {' '.join(texts)}"
+
+
+def iter_transcript_chunks(transcript, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                           count_tokens=count_tokens):
+    """
+    Chunk a Fireflies transcript, or a CompactTranscript (which knows its turns), on speaker turns.
+    """
+    if hasattr(transcript, 'iter_turns'):
+        turns = transcript.iter_turns()
+    else:
+        turns = iter_speaker_turns(transcript.get('sentences') or [])
+    return pack_units(turns, max_tokens, overlap_tokens, count_tokens, speaker_turns=True)
+
+
+def iter_page_chunks(pages, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, count_tokens=count_tokens):
+    """
+    Chunk an iterable of page texts without crossing page boundaries.
+    Yields (page_number, chunk) with 1-based page numbers.
+    """
+    for page_number, text in enumerate(pages, start=1):
+        if not text or not text.strip():  # Skip empty pages
+            continue
+        for chunk in iter_text_chunks(text, max_tokens, overlap_tokens, count_tokens):
+            yield page_number, chunk
@@ -0,0 +1,27 @@
+import hashlib
+import os
+
+from cache_utils import DiskCache
+
+
+class ContentStore:
+    """
+    Local store for the chunk text compact-mode points keep out of the vector store, referenced from payloads by text_id.
+    Text is content-addressed, so the same chunk indexed for several meetings is stored once.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 * 1024 * 1024):
+        self.texts = DiskCache(os.path.join(directory, "texts.sqlite3"), max_entries=10_000_000, max_bytes=max_bytes)
+
+    def text_id(self, text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def put_texts(self, texts):
+        """Store texts and return their ids."""
+        ids = [self.text_id(text) for text in texts]
+        self.texts.set_many({text_id: text.encode("utf-8") for text_id, text in zip(ids, texts)})
+        return ids
+
+    def get_texts(self, text_ids):
+        """Return a dict of text_id -> text for the ids found."""
+        return {text_id: value.decode("utf-8") for text_id, value in self.texts.get_many(list(text_ids)).items()}
@@ -5,12 +5,14 @@ import json  # For JSON parsing
 from transcript_utils import *
 import re
 from transcript_utils import get_transcript_speakers
+from llm_client import add_usage, chat_completion
+from prompt_budget import ROLE_CONTEXT_TOKENS, truncate_tokens
 
 # OpenAI API Key
 OPENAI_API_KEY = 'xxxx'
 openai.api_key = OPENAI_API_KEY
 
-def classify_context(selected_flow, retrieved_context, roles):
+def classify_context(selected_flow, retrieved_context, roles, usage=None, bypass_cache=False):
     """
     Classify retrieved context into one of the scenarios based on the selected flow.
     Returns the exact matching scenario text along with the category name, reason, and quote.
@@ -52,17 +54,19 @@ def classify_context(selected_flow, retrieved_context, roles):
 
     try:
         # Make GPT-4 call
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
+        response = chat_completion(
+            "classify_context",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an AI assistant designed to classify into fixed scenarios and provide reasons with quotes."},
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            bypass_cache=bypass_cache
         )
+        add_usage(usage, response)
 
         # Extract and log classification
-        classification = response.choices[0].message.content.strip()
+        classification = response.content.strip()
         logging.info(f"Classification: {classification}")
 
         # Return classification result directly
@@ -77,7 +81,83 @@ def classify_context(selected_flow, retrieved_context, roles):
         }
 
 
-def role_identifier(transcript, notes, investor_report, meeting_details,speakers):
+DETECTION_FLOWS = ("nda", "dataroom", "prenda")
+
+def detect_flows(retrieved_context, roles, usage=None, bypass_cache=False):
+    """
+    Single structured call replacing the three keyword checks and classify_context.
+    Returns {"nda" | "dataroom" | "prenda": {"mentioned", "reasoning", "scenario", "reason", "quote"}}.
+    """
+    prompt = f"""
+    Analyze the following meeting context for three topics and classify each into its scenario.
+
+    Topics:
+    nda: NDA (non-disclosure agreement)
+        - Investor asks for NDA
+        - Lead/Client says they will send NDA or wait for NDA
+    dataroom: data room
+        - Investor requests data room
+        - Client/lead says send data room
+    prenda: supporting documents or more information for the company from the investor (Pre-NDA)
+        - Investor requests additional/supporting docs
+        - Client/lad says they will send additional docs
+
+    Rules:
+    1. For each topic, set "mentioned" to true if the context explicitly or implicitly refers to it, otherwise false.
+    2. "reasoning": a clear and concise reasoning for the decision; if implied, explain how.
+    3. "scenario": the **exact matching scenario text** followed by the **category name** (e.g., 'Investor asks for NDA and NDA'), or 'None'.
+    4. "reason": why this scenario was chosen, using references to the roles.
+    5. "quote": a direct quote from the context that supports the classification, or "".
+
+    Context:
+    \"\"\"{retrieved_context}\"\"\"
+
+    Roles:
+    \"\"\"{roles}\"\"\"
+
+    Output only this JSON:
+    {{
+        "nda": {{"mentioned": <true|false>, "reasoning": "<reasoning>", "scenario": "<scenario text> and <category>", "reason": "<reason>", "quote": "<quote>"}},
+        "dataroom": {{...same fields...}},
+        "prenda": {{...same fields...}}
+    }}
+    """
+
+    try:
+        response = chat_completion(
+            "detect_flows",
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": "You are an assistant detecting NDA, data room and pre-NDA requests in meetings and classifying them into fixed scenarios. DO NOT USE BACK ANY PREVIOUS INFORMATION OR ANSWERS"},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.2,
+            bypass_cache=bypass_cache
+        )
+        add_usage(usage, response)
+        detection = json.loads(response.content)
+        logging.info(f"Flow detection: {detection}")
+
+    except Exception as e:
+        logging.error(f"Error in detect_flows: {e}")
+        detection = {}
+
+    # Missing or malformed topics count as not mentioned, like a failed keyword check
+    verdicts = {}
+    for flow in DETECTION_FLOWS:
+        verdict = detection.get(flow) if isinstance(detection.get(flow), dict) else {}
+        verdicts[flow] = {
+            "mentioned": verdict.get("mentioned") is True,
+            "reasoning": verdict.get("reasoning", "No verdict returned."),
+            "scenario": verdict.get("scenario", "None"),
+            "reason": verdict.get("reason", ""),
+            "quote": verdict.get("quote", ""),
+        }
+    return verdicts
+
+
+def role_identifier(transcript, notes, investor_report, meeting_details,speakers,bypass_cache=False):
     """
     Identifies roles of speakers based on transcript, notes, investor report, and meeting details.
     Roles: 'Facilitator', 'Investor', 'Client'.
@@ -94,7 +174,7 @@ def role_identifier(transcript, notes, investor_report, meeting_details,speakers
     - Guest: Default if no clear role applies.
 
     Investor Report:
-    {investor_report}
+    {truncate_tokens(investor_report, ROLE_CONTEXT_TOKENS)}
 
     Output format (only output the json do not output any other text):
     {{
@@ -105,17 +185,18 @@ def role_identifier(transcript, notes, investor_report, meeting_details,speakers
     """
 
     # Call GPT-4 API
-    client = openai.OpenAI()
-    response = client.chat.completions.create(
+    response = chat_completion(
+        "role_identifier",
         model="gpt-4",
         messages=[
             {"role": "system", "content": "Filter speakers then classify speaker roles based on context."},
             {"role": "user", "content": prompt}
-        ]
+        ],
+        bypass_cache=bypass_cache
     )
 
     # Process GPT response
-    gpt_reply = response.choices[0].message.content.strip()
+    gpt_reply = response.content.strip()
     logging.info(f"GPT Analysis: {gpt_reply}")
 
     return gpt_reply
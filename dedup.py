@@ -0,0 +1,114 @@
+import hashlib
+import re
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+SHINGLE_PATTERN = re.compile(r"\w+")
+WHITESPACE = re.compile(r"\s+")
+
+# Near-duplicates: 64-bit SimHash within this Hamming distance. A few edited words in a
+# 200-token chunk typically move the hash by under 8 bits; unrelated chunks differ by ~32.
+# Splitting the hash into max_distance + 1 bands guarantees a near-duplicate shares at least one band.
+SIMHASH_MAX_DISTANCE = 7
+# Texts with fewer shingles than this are only checked for exact duplicates
+SIMHASH_MIN_SHINGLES = 8
+
+
+def normalize(text):
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+
+def simhash(text, shingle_size=3):
+    """
+    64-bit SimHash over word shingles; returns None when text is too short for a stable hash.
+    """
+    words = SHINGLE_PATTERN.findall(text.lower())
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(len(words) - shingle_size + 1, 0))]
+    if len(shingles) < SIMHASH_MIN_SHINGLES:
+        return None
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big") for shingle in shingles],
+        dtype=np.uint64,
+    )
+    bits = np.unpackbits(hashes.byteswap().view(np.uint8).reshape(-1, 8), axis=1)  # (n, 64), MSB first
+    weights = (bits.astype(np.int32) * 2 - 1).sum(axis=0)
+    value = 0
+    for bit in weights > 0:
+        value = (value << 1) | int(bit)
+    return value
+
+
+class ChunkDeduplicator:
+    """
+    Drops exact duplicates (hash of normalized text) and near-duplicates (SimHash) before embedding.
+    Surviving points collect the provenance of the chunks they replaced in payload["provenance"].
+    """
+
+    def __init__(self, max_distance=SIMHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self._lock = threading.Lock()
+        self._exact = {}  # content hash -> point id
+        self._buckets = defaultdict(list)  # (band, band value) -> [(simhash, point id)]
+        self._survivors = {}  # point id -> (payload, provenance entry)
+        self._dirty = set()  # point ids whose provenance changed since the last pop_dirty
+        self.stats = {"chunks": 0, "unique": 0, "exact_duplicates": 0, "near_duplicates": 0}
+
+    def _band_keys(self, value):
+        mask = (1 << self.band_bits) - 1
+        return [(band, (value >> (band * self.band_bits)) & mask) for band in range(self.bands)]
+
+    def _find_near(self, value):
+        for key in self._band_keys(value):
+            for candidate, point_id in self._buckets.get(key, ()):
+                if bin(candidate ^ value).count("1") <= self.max_distance:
+                    return point_id
+        return None
+
+    def add(self, point_id, payload, provenance):
+        """
+        Register a chunk. Returns True if it is new and should be embedded,
+        False if it duplicates an earlier chunk (whose provenance is then extended).
+        """
+        text = payload.get("text") or ""
+        content_hash = hashlib.sha1(normalize(text).encode("utf-8")).hexdigest()
+        value = simhash(text)
+
+        with self._lock:
+            self.stats["chunks"] += 1
+            survivor = self._exact.get(content_hash)
+            kind = "exact_duplicates"
+            if survivor is None and value is not None:
+                survivor = self._find_near(value)
+                kind = "near_duplicates"
+
+            if survivor is not None:
+                self.stats[kind] += 1
+                survivor_payload, survivor_provenance = self._survivors[survivor]
+                survivor_payload.setdefault("provenance", [survivor_provenance]).append(provenance)
+                self._dirty.add(survivor)
+                return False
+
+            self.stats["unique"] += 1
+            self._exact[content_hash] = point_id
+            if value is not None:
+                for key in self._band_keys(value):
+                    self._buckets[key].append((value, point_id))
+            self._survivors[point_id] = (payload, provenance)
+            return True
+
+    def pop_dirty(self):
+        """Return {point id: provenance list} for survivors that gained duplicates since the last call."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return {point_id: list(self._survivors[point_id][0]["provenance"]) for point_id in dirty}
+
+    def report(self):
+        """Chunks seen and dropped; every dropped chunk is one encode and one upsert saved."""
+        with self._lock:
+            dropped = self.stats["exact_duplicates"] + self.stats["near_duplicates"]
+            return {**self.stats, "encodes_saved": dropped}
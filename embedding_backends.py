@@ -0,0 +1,151 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+ONNX_MODEL_FILE = "model_quantized.onnx"
+
+
+class SentenceTransformerBackend:
+    """
+    PyTorch SentenceTransformer model (reference implementation).
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self.model = SentenceTransformer(model_name)  # Pre-trained model
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=64):
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+
+class OnnxEmbeddingBackend:
+    """
+    int8-quantized ONNX export of the same model, run with onnxruntime on CPU.
+    Reproduces the SentenceTransformer pipeline: mean pooling over the attention mask, then L2 normalization.
+    """
+
+    def __init__(self, model_dir, model_name=EMBEDDING_MODEL, max_length=256, threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.name = f"{model_name}-onnx-int8"
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def encode(self, texts, batch_size=64):
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            encoded = self.tokenizer(
+                batch, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+            )
+            inputs = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            # Mean pooling over real tokens, then normalize
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            vectors[start:start + len(batch)] = pooled / np.clip(norms, 1e-12, None)
+        return vectors
+
+
+def make_embedding_backend(backend, model_name=EMBEDDING_MODEL, onnx_model_dir=None):
+    """
+    Build the embedding backend ("torch" or "onnx").
+    """
+    if backend == "torch":
+        return SentenceTransformerBackend(model_name)
+    if backend == "onnx":
+        return OnnxEmbeddingBackend(onnx_model_dir, model_name)
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def export_onnx_model(output_dir, model_name=EMBEDDING_MODEL):
+    """
+    Export the transformer behind model_name to ONNX and quantize its weights to int8.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    model = AutoModel.from_pretrained(hub_name)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    float_path = os.path.join(output_dir, "model.onnx")
+    torch.onnx.export(
+        model,
+        tuple(sample[name] for name in input_names),
+        float_path,
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes=dynamic_axes,
+        opset_version=14,
+    )
+    quantize_dynamic(float_path, os.path.join(output_dir, ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(output_dir)
+    logging.info(f"Exported quantized ONNX model to {output_dir}")
+
+
+def check_parity(reference, candidate, texts, threshold=0.99, batch_size=64):
+    """
+    Compare candidate vectors against reference vectors for the same texts.
+    Passes when every pair has cosine similarity of at least threshold.
+    """
+    expected = reference.encode(texts, batch_size=batch_size)
+    actual = candidate.encode(texts, batch_size=batch_size)
+    return compare_vectors(expected, actual, threshold)
+
+
+def compare_vectors(expected, actual, threshold=0.99):
+    """
+    Cosine parity of two row-aligned vector matrices; see check_parity.
+    """
+    cosine = (expected * actual).sum(axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "threshold": threshold,
+        "passed": bool(cosine.min() >= threshold),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the embedding model as an int8-quantized ONNX model.")
+    parser.add_argument("output_dir", nargs="?", default=os.path.join("models", f"{EMBEDDING_MODEL}-onnx"))
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export_onnx_model(args.output_dir, args.model)
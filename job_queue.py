@@ -0,0 +1,290 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+JOB_COLUMNS = "id, meeting_id, status, attempts, payload, result, error, created_at, updated_at"
+# A running job whose worker hasn't renewed its lease for this long is presumed dead and re-queued
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+
+
+class JobQueue:
+    """
+    Durable FIFO job queue on local disk backed by SQLite.
+    Jobs move queued -> running -> done | failed. A claimed job is leased for lease_seconds and its worker
+    renews the lease while it runs; jobs whose lease expired (their process died) are re-queued, so several
+    processes can share one database without taking over each other's running jobs.
+    Finished jobs keep their results, so the table doubles as the result store for idempotent submits.
+    A job also records when it sent its side effect (the follow-up email), so re-runs can skip it.
+    """
+
+    def __init__(self, path, max_attempts=3, lease_seconds=JOB_LEASE_SECONDS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        # Set whenever a job is enqueued, so idle workers wake up without waiting for the next poll
+        self.available = threading.Event()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Autocommit mode; multi-statement updates open their own transactions
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                meeting_id TEXT NOT NULL,
+                idempotency_key TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "idempotency_key" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN idempotency_key TEXT")
+        if "lease_expires_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+        if "email_sent_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN email_sent_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_meeting_id ON jobs (meeting_id, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_idempotency_key ON jobs (idempotency_key, created_at)")
+        self.recover()
+
+    def _requeue_expired(self, now):
+        """Re-queue running jobs whose lease expired, failing those out of attempts. Call with the lock held."""
+        self._conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Too many attempts', updated_at = ? "
+            "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?) AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        return self._conn.execute(
+            "UPDATE jobs SET status = 'queued', updated_at = ? "
+            "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+            (now, now),
+        ).rowcount
+
+    def recover(self):
+        """Re-queue jobs whose worker stopped renewing their lease (e.g. the process crashed)."""
+        with self._lock:
+            recovered = self._requeue_expired(time.time())
+        if recovered:
+            logging.warning(f"Re-queued {recovered} interrupted jobs from {self.path}")
+            self.available.set()
+
+    def _insert(self, meeting_id, payload, idempotency_key=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO jobs (id, meeting_id, idempotency_key, payload, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, meeting_id, idempotency_key, json.dumps(payload), now, now),
+        )
+        return job_id
+
+    def enqueue(self, meeting_id, payload):
+        """Persist a job and return its id."""
+        with self._lock:
+            job_id = self._insert(meeting_id, payload)
+        self.available.set()
+        return job_id
+
+    def enqueue_once(self, meeting_id, idempotency_key, payload, force=False):
+        """
+        Idempotent submit. Returns (job, created):
+        a queued or running job with the same key is returned instead of a duplicate (coalesced),
+        and so is a finished one unless force is set; failed jobs are retried with a new job.
+        """
+        with self._lock:
+            # Serialize check-and-insert against other processes sharing the database
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {JOB_COLUMNS} FROM jobs WHERE idempotency_key = ? ORDER BY created_at DESC LIMIT 1",
+                    (idempotency_key,),
+                ).fetchone()
+                existing = self._row_to_job(row) if row else None
+                if existing and (existing["status"] in ("queued", "running") or (existing["status"] == "done" and not force)):
+                    self._conn.execute("COMMIT")
+                    return existing, False
+                job_id = self._insert(meeting_id, payload, idempotency_key)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.available.set()
+        return self.get(job_id), True
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self):
+        """Mark the oldest queued job running and return (job id, payload), or None if the queue is empty."""
+        with self._lock:
+            if self._requeue_expired(time.time()):
+                logging.warning(f"Re-queued jobs with expired leases from {self.path}")
+            while True:
+                row = self._conn.execute(
+                    "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self.available.clear()
+                    return None
+                # Conditional update, so two processes sharing the database never claim the same job
+                now = time.time()
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?, lease_expires_at = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (now, now + self.lease_seconds, row[0]),
+                ).rowcount
+                if claimed:
+                    return row[0], json.loads(row[1])
+
+    def renew(self, job_ids):
+        """Extend the leases of running jobs held by this process."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = 'running'",
+                [(now + self.lease_seconds, job_id) for job_id in job_ids],
+            )
+
+    def mark_email_sent(self, job_id):
+        """Record that job_id sent its email, before the job is acked."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET email_sent_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def email_sent(self, job_id):
+        """
+        Whether job_id, or any job with its idempotency key, already sent its email: true for a job re-run
+        after its lease expired, and for the retry of a job that failed after sending.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE email_sent_at IS NOT NULL "
+                "AND (id = ? OR idempotency_key = (SELECT idempotency_key FROM jobs WHERE id = ?)) LIMIT 1",
+                (job_id, job_id),
+            ).fetchone()
+        return row is not None
+
+    def complete(self, job_id, result):
+        self._finish(job_id, "done", result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, "failed", error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    def _row_to_job(self, row):
+        job_id, meeting_id, status, attempts, payload, result, error, created_at, updated_at = row
+        return {
+            "job_id": job_id,
+            "meeting_id": meeting_id,
+            "status": status,
+            "attempts": attempts,
+            "payload": json.loads(payload),
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def jobs_for_meeting(self, meeting_id):
+        """Every job for meeting_id, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE meeting_id = ? ORDER BY created_at DESC",
+                (meeting_id,),
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class WorkerPool:
+    """
+    Fixed pool of daemon threads that claim jobs from a JobQueue and run handler(payload) on each,
+    with the job's id added to the payload under "job_id".
+    The handler's return value (JSON-serializable) is stored as the job result; exceptions fail the job.
+    """
+
+    def __init__(self, queue, handler, workers=2, poll_interval=5.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._active = set()  # Job ids running in this pool, whose leases the heartbeat renews
+        self._active_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the workers and the lease heartbeat; later calls are no-ops."""
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            self._start()
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logging.info(f"Started {self.workers} job workers")
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.queue.lease_seconds / 3)
+            with self._active_lock:
+                active = list(self._active)
+            if active:
+                try:
+                    self.queue.renew(active)
+                except Exception as e:
+                    logging.error(f"Failed to renew job leases: {e}")
+
+    def _run(self):
+        while True:
+            job = self.queue.claim()
+            if job is None:
+                self.queue.available.wait(self.poll_interval)
+                continue
+
+            job_id, payload = job
+            with self._active_lock:
+                self._active.add(job_id)
+            try:
+                result = self.handler({**payload, "job_id": job_id})
+                self.queue.complete(job_id, result)
+            except Exception as e:
+                logging.error(f"Job {job_id} failed: {e}")
+                self.queue.fail(job_id, e)
+            finally:
+                with self._active_lock:
+                    self._active.discard(job_id)
@@ -0,0 +1,129 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+ALTERNATIVE_SEPARATOR = re.compile(r"\s+or\s+", re.IGNORECASE)
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or",
+    "that", "the", "this", "to", "was", "we", "with", "you",
+}
+
+LexicalHit = namedtuple("LexicalHit", ["id", "score", "payload", "exact"])
+
+
+def tokenize(text):
+    """
+    Lowercase word tokens with stopwords removed.
+    Hyphenated words split into parts, so "Non-Disclosure" matches "non disclosure".
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def query_alternatives(query):
+    """
+    Split "NDA or Non-Disclosure Agreement" into term sets: [{"nda"}, {"non", "disclosure", "agreement"}].
+    """
+    alternatives = []
+    for part in ALTERNATIVE_SEPARATOR.split(query):
+        terms = set(tokenize(part))
+        if terms:
+            alternatives.append(terms)
+    return alternatives
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring, updated incrementally as points are added and removed.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+            self._docs = {}  # doc_id -> (length, term frequencies, payload)
+            self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, doc_id, text, payload):
+        frequencies = Counter(tokenize(text))
+        length = sum(frequencies.values())
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove(doc_id)
+            self._docs[doc_id] = (length, frequencies, payload)
+            self._total_length += length
+            for term, frequency in frequencies.items():
+                self._postings[term][doc_id] = frequency
+
+    def _remove(self, doc_id):
+        length, frequencies, _ = self._docs.pop(doc_id)
+        self._total_length -= length
+        for term in frequencies:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def remove_where(self, predicate):
+        """Remove every document whose payload satisfies predicate."""
+        with self._lock:
+            doc_ids = [doc_id for doc_id, (_, _, payload) in self._docs.items() if predicate(payload)]
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+            return len(doc_ids)
+
+    def remove_scope(self, scope):
+        return self.remove_where(lambda payload: payload.get("scope") == scope)
+
+    def remove_by_field(self, field, value, scope=None):
+        """Remove the documents of exactly scope (unscoped ones when None) whose payload field equals value."""
+        return self.remove_where(lambda payload: payload.get(field) == value and payload.get("scope") == scope)
+
+    def remove_expired(self, now=None):
+        now = time.time() if now is None else now
+        return self.remove_where(lambda payload: payload.get("expires_at", math.inf) < now)
+
+    def search(self, query, top_k, scope=None):
+        """
+        Return the top_k documents by BM25 score for query, restricted to scope if given.
+        A hit is exact when it contains every term of at least one "or"-separated alternative of the query.
+        """
+        alternatives = query_alternatives(query)
+        terms = set().union(*alternatives) if alternatives else set()
+
+        with self._lock:
+            count = len(self._docs)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count
+
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    length, _, payload = self._docs[doc_id]
+                    if scope is not None and payload.get("scope") != scope:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            hits = []
+            for doc_id, score in ranked:
+                _, frequencies, payload = self._docs[doc_id]
+                exact = any(all(term in frequencies for term in alternative) for alternative in alternatives)
+                hits.append(LexicalHit(doc_id, score, payload, exact))
+            return hits
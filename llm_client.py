@@ -0,0 +1,315 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+
+import httpx
+import openai
+
+from cache_utils import DiskCache
+from metrics import dependency_span
+from prompt_budget import count_tokens
+
+# On-disk cache of chat completions, shared by every GPT call site and across restarts
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+# Skip cache lookups (responses are still stored, refreshing the cache)
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("cache", "llm.sqlite3"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 50_000))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Shared OpenAI client: pooled keep-alive connections (OPENAI_BASE_URL points it at a fake server)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", 120))
+# Client-side limits, set to the account's requests and tokens per minute
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", 500))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", 30_000))
+# Completion tokens assumed for requests without max_tokens, until the real usage is known
+DEFAULT_COMPLETION_TOKENS = 500
+# Retries on 429, 5xx and connection errors: jittered exponential backoff, at least Retry-After
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 1.0))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 30.0))
+RETRYABLE_ERRORS = (
+    openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError
+)
+
+
+class LLMResponse:
+    """
+    Text and token usage of a chat completion; cached is True when it was served from the cache.
+    """
+
+    def __init__(self, content, prompt_tokens=0, completion_tokens=0, cached=False):
+        self.content = content
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cached = cached
+
+
+class LLMCache:
+    """
+    Chat completion cache keyed by a hash of the model, messages and request parameters.
+    Entries expire after ttl seconds and are evicted least-recently-used beyond the size bounds.
+    """
+
+    def __init__(self, path, ttl=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.store = DiskCache(path, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self._lock = threading.Lock()
+        self._call_sites = defaultdict(lambda: {"hits": 0, "misses": 0, "bypassed": 0})
+
+    def key(self, model, messages, params):
+        request = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        value = self.store.get(key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return LLMResponse(entry["content"], entry["prompt_tokens"], entry["completion_tokens"], cached=True)
+
+    def set(self, key, response):
+        self.store.set(key, json.dumps({
+            "content": response.content,
+            "prompt_tokens": response.prompt_tokens,
+            "completion_tokens": response.completion_tokens,
+        }).encode("utf-8"))
+
+    def record(self, call_site, outcome):
+        with self._lock:
+            self._call_sites[call_site][outcome] += 1
+
+    def stats(self):
+        """Hits, misses and bypasses per call site, plus the size of the cache."""
+        with self._lock:
+            call_sites = {call_site: dict(counts) for call_site, counts in self._call_sites.items()}
+        store = self.store.stats()
+        return {"call_sites": call_sites, "entries": store["entries"], "bytes": store["bytes"]}
+
+
+llm_cache = LLMCache(LLM_CACHE_PATH) if LLM_CACHE_ENABLED else None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at per_minute / 60 per second, holding at most per_minute.
+    reserve() always succeeds and returns how long the caller must wait before using what it took,
+    so waiting callers are served in order and nobody polls.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount):
+        """Return (positive) or take (negative) tokens once the real cost is known."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute limits, shared by all threads.
+    """
+
+    def __init__(self, rpm=OPENAI_RPM, tpm=OPENAI_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, estimated_tokens):
+        """Block until a request of estimated_tokens may be sent; returns the seconds waited."""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def settle(self, estimated_tokens, actual_tokens):
+        self.tokens.adjust(estimated_tokens - actual_tokens)
+
+
+def estimate_tokens(messages, model="gpt-4o", max_tokens=None):
+    """
+    Token count of a request before sending it: prompt tokens, a few tokens of overhead
+    per message, plus the completion budget.
+    """
+    prompt_tokens = sum(count_tokens(message.get("content") or "", model) for message in messages)
+    return prompt_tokens + 4 * len(messages) + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def retry_after_seconds(error):
+    """Server-requested delay from a Retry-After (seconds or HTTP date) or retry-after-ms header, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff_seconds(attempt, error=None):
+    """Full-jitter exponential backoff, raised to the server's Retry-After when it asks for longer."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+_client = None
+_client_lock = threading.Lock()
+rate_limiter = RateLimiter()
+client_stats = {"requests": 0, "retries": 0, "rate_limited": 0, "throttled_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide OpenAI client. Requests carry their full message list, so sharing the
+    client keeps calls stateless while reusing pooled HTTP connections.
+    Retries are handled by chat_completion, not the SDK.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = openai.OpenAI(
+                max_retries=0,
+                timeout=OPENAI_TIMEOUT_SECONDS,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+                    ),
+                    timeout=OPENAI_TIMEOUT_SECONDS,
+                ),
+            )
+        return _client
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        client_stats[name] += amount
+
+
+def create_completion(model, messages, **params):
+    """
+    Send one chat completion through the rate limiter, retrying transient failures.
+    """
+    estimated = estimate_tokens(messages, model, params.get("max_tokens"))
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        waited = rate_limiter.acquire(estimated)
+        _count("requests")
+        _count("throttled_seconds", waited)
+        try:
+            completion = get_client().chat.completions.create(model=model, messages=messages, **params)
+        except RETRYABLE_ERRORS as e:
+            if isinstance(e, openai.RateLimitError):
+                _count("rate_limited")
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = backoff_seconds(attempt, e)
+            _count("retries")
+            logging.warning(f"OpenAI request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if completion.usage is not None:
+            rate_limiter.settle(estimated, completion.usage.total_tokens)
+        return completion
+
+
+def llm_client_stats():
+    with _stats_lock:
+        return {**client_stats, "throttled_seconds": round(client_stats["throttled_seconds"], 3)}
+
+
+def chat_completion(call_site, model, messages, bypass_cache=False, **params):
+    """
+    Run a chat completion through the shared cache.
+    call_site names the caller in the hit statistics; bypass_cache forces a fresh call.
+    Returns an LLMResponse.
+    """
+    key = None
+    if llm_cache is not None:
+        key = llm_cache.key(model, messages, params)
+        if bypass_cache or LLM_CACHE_BYPASS:
+            llm_cache.record(call_site, "bypassed")
+        else:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                llm_cache.record(call_site, "hits")
+                logging.info(f"LLM cache hit for {call_site}")
+                return cached
+            llm_cache.record(call_site, "misses")
+
+    with dependency_span("openai", call_site):
+        completion = create_completion(model, messages, **params)
+    usage = completion.usage
+    response = LLMResponse(
+        completion.choices[0].message.content,
+        usage.prompt_tokens if usage else 0,
+        usage.completion_tokens if usage else 0,
+    )
+
+    if key is not None:
+        llm_cache.set(key, response)
+    return response
+
+
+# Concurrent checks add to the same usage totals
+_usage_lock = threading.Lock()
+
+
+def add_usage(usage, response):
+    """
+    Add the token usage of an LLMResponse to the usage totals dict (no-op when usage is None).
+    Cache hits are counted separately and cost no tokens.
+    """
+    if usage is None:
+        return
+    with _usage_lock:
+        if response.cached:
+            usage["cache_hits"] = usage.get("cache_hits", 0) + 1
+            return
+        usage["calls"] = usage.get("calls", 0) + 1
+        usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + response.prompt_tokens
+        usage["completion_tokens"] = usage.get("completion_tokens", 0) + response.completion_tokens
+
+
+def llm_cache_stats():
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.stats()}
@@ -0,0 +1,110 @@
+import contextvars
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Stages last from milliseconds (cache hits) to minutes (whole jobs)
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "webhook_stage_duration_seconds", "Duration of each stage of webhook processing", ["stage"], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter("webhook_stage_errors_total", "Stages that raised", ["stage"])
+DEPENDENCY_SECONDS = Histogram(
+    "external_call_duration_seconds", "Duration of calls to external dependencies",
+    ["dependency", "operation"], buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_ERRORS = Counter("external_call_errors_total", "Failed calls to external dependencies", ["dependency", "operation"])
+FLOW_SECONDS = Histogram("flow_duration_seconds", "Duration of the follow-up flows", ["flow"], buckets=LATENCY_BUCKETS)
+FLOWS_TOTAL = Counter("flows_total", "Follow-up flows entered", ["flow"])
+JOBS_TOTAL = Counter("webhook_jobs_total", "Webhook jobs by outcome", ["outcome"])
+
+# Trace of the job running in this context: {"trace_id", "spans": [...]}
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def trace(trace_id=None):
+    """
+    Collect the spans recorded in this context (and in work submitted with copy_context) under trace_id.
+    Yields the trace dict.
+    """
+    current = {"trace_id": trace_id or new_trace_id(), "spans": []}
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace_id():
+    current = _current_trace.get()
+    return current["trace_id"] if current else None
+
+
+def _record(kind, name, start, error):
+    elapsed = time.perf_counter() - start
+    current = _current_trace.get()
+    if current is not None:
+        current["spans"].append({"kind": kind, "name": name, "seconds": round(elapsed, 4), "error": error})
+    logging.info(f"[trace {current['trace_id'] if current else '-'}] {kind} {name} took {elapsed:.3f}s")
+    return elapsed
+
+
+@contextmanager
+def span(stage):
+    """Time a stage of webhook processing."""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage).observe(_record("stage", stage, start, error))
+
+
+@contextmanager
+def dependency_span(dependency, operation):
+    """Time a call to an external dependency (OpenAI, Fireflies, MySQL, Qdrant, ...)."""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        DEPENDENCY_ERRORS.labels(dependency, operation).inc()
+        raise
+    finally:
+        DEPENDENCY_SECONDS.labels(dependency, operation).observe(
+            _record("dependency", f"{dependency}.{operation}", start, error)
+        )
+
+
+@contextmanager
+def flow_span(flow):
+    """Time one of the follow-up flows (nda_flow, dataroom_flow, prenda_flow)."""
+    FLOWS_TOTAL.labels(flow).inc()
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        FLOW_SECONDS.labels(flow).observe(_record("flow", flow, start, error))
+
+
+def render_metrics():
+    """Return (body, content type) in the Prometheus text exposition format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
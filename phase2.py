@@ -1,107 +1,188 @@
 import json
-from flask import Flask, request, jsonify
+import os
+import re
+import threading
+from flask import Flask, Response, request, jsonify, send_file
 import logging
-import requests
-import fitz  # PyMuPDF for PDF processing
 import uuid  # For generating UUIDs as valid IDs
+import time
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 from RAG import RAGKBProcessor
+from chunking import iter_page_chunks, iter_transcript_chunks
+from job_queue import JobQueue, WorkerPool
+from report_fetcher import ReportFetcher
+from metrics import JOBS_TOTAL, current_trace_id, dependency_span, flow_span, new_trace_id, render_metrics, span, trace
 from database_utils import get_meeting_details_and_notes_by_fuzzy_title
 from outlook import send_email, get_access_token_outlook
 from transcript_utils import *
-import openai  # GPT API integration
-from context_gathering import classify_context, role_identifier
+from llm_client import add_usage, chat_completion, llm_cache_stats, llm_client_stats
+from prompt_budget import PROMPT_CONTEXT_TOKENS, build_context
+from context_gathering import DETECTION_FLOWS, classify_context, detect_flows, role_identifier
 from enum import Enum
-import threading  # For handling request locks
 
 # Flask Application
 app = Flask(__name__)
 
 # Logging Setup
-logging.basicConfig(level=logging.WARNING)  # Only logs warnings and errors
-
-# Initialize RAGKBProcessor
-rag_processor = RAGKBProcessor()
-
-# Thread lock to handle single POST request at a time
-request_lock = threading.Lock()
+# Only logs warnings and errors by default; LOG_LEVEL=INFO adds per-stage timings.
+# force: database_utils and transcript_utils already configured the root logger at INFO on import
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), force=True)
+
+# Spawned helper processes (RAGKBProcessor's PDF text extraction) re-import the main module as __mp_main__.
+# When this file is run directly they must not load the model or start workers of their own
+SPAWNED_HELPER = __name__ == "__mp_main__"
+
+# Retrieval queries used by the flow checks, embedded once at startup
+NDA_QUERY = "NDA or Non-Disclosure Agreement"
+DATAROOM_QUERY = "data room or dataroom"
+PRENDA_QUERY = "supporting documents or more information"
+FLOW_QUERIES = [NDA_QUERY, DATAROOM_QUERY, PRENDA_QUERY]
+# Chunks retrieved per flow query; the prompt budget decides how many are actually sent
+FLOW_TOP_K = int(os.getenv("FLOW_TOP_K", 8))
+
+if not SPAWNED_HELPER:
+    # Initialize RAGKBProcessor. Other processes may share the collection (and the job queue) with this one,
+    # so it is kept: only scopes left behind by crashed processes are dropped, once they expire
+    rag_processor = RAGKBProcessor(recreate_collection=False)
+
+    # Each request indexes into its own scope; expired scopes are collected now and then in the background
+    rag_processor.collect_expired_scopes()
+    rag_processor.start_scope_gc()
+    rag_processor.precompute_queries(FLOW_QUERIES)
+
+# Webhooks are persisted to a local queue and processed by a pool of workers
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join("cache", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+job_queue = JobQueue(JOB_QUEUE_PATH)
+# Id of the job being processed, for its side-effect markers
+current_job_id = contextvars.ContextVar("job_id", default=None)
+
+# The flow checks of logic_block run concurrently on this pool (three checks per job)
+CHECK_WORKERS = int(os.getenv("CHECK_WORKERS", 3 * JOB_WORKERS))
+check_executor = ThreadPoolExecutor(max_workers=CHECK_WORKERS, thread_name_prefix="flow-check")
+
+# "multi": one GPT keyword check per flow, then classify_context in the chosen flow (up to five calls).
+# "consolidated": one structured call returns the verdict and scenario for every flow.
+DETECTION_MODE = os.getenv("DETECTION_MODE", "multi")
+
+# Investor reports are downloaded and extracted once, then revalidated against the server
+report_fetcher = ReportFetcher()
+
+# Transcript PDFs are archived off the critical path: "background" renders them on a small pool once the
+# transcript is fetched, "lazy" only on the first GET /<user>/transcripts/<meetingId>.pdf
+PDF_ARCHIVE_MODE = os.getenv("PDF_ARCHIVE_MODE", "background")
+PDF_ARCHIVE_DIR = os.getenv("PDF_ARCHIVE_DIR", "transcripts")
+PDF_ARCHIVE_WORKERS = int(os.getenv("PDF_ARCHIVE_WORKERS", 1))
+# Background archives waiting beyond this many are skipped, and rendered on first request instead
+PDF_ARCHIVE_MAX_PENDING = int(os.getenv("PDF_ARCHIVE_MAX_PENDING", 16))
+pdf_executor = ThreadPoolExecutor(max_workers=PDF_ARCHIVE_WORKERS, thread_name_prefix="pdf-archive")
+pdf_archive_slots = threading.BoundedSemaphore(PDF_ARCHIVE_MAX_PENDING)
+# On-demand renders run in the requesting thread, not behind the archive backlog. Concurrent requests for
+# one meeting share a render; beyond this many meetings rendering at once, requests get a 503
+PDF_RENDER_MAX_INFLIGHT = int(os.getenv("PDF_RENDER_MAX_INFLIGHT", 4))
+pdf_renders = {}  # meeting_id -> Future of the rendered PDF path
+pdf_renders_lock = threading.Lock()
 
 # GPT API Key
 OPENAI_API_KEY = 'xxxx'
 
-def process_investor_report(report_url, meeting_id, title):
+def process_investor_report(report_url, meeting_id, title, scope):
     """
     Download, extract text, and store the investor report in the RAG knowledge base.
     """
     try:
-        # Step 1: Download the report
-        response = requests.get(report_url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to download report: {response.status_code}")
-
-        # Step 2: Save locally
-        local_path = f"investor_report_{meeting_id}.pdf"
-        with open(local_path, "wb") as file:
-            file.write(response.content)
-
-        # Step 3: Extract text from PDF
-        doc = fitz.open(local_path)
-        content = ""
-        for page in doc:
-            content += page.get_text()
-
-        # Step 4: Vectorize the investor report
-        vectorize_data(content, "investor_report", meeting_id, title)
+        # Steps 1-3: Stream the report and extract the text of its pages in memory (cached by URL)
+        pages = report_fetcher.fetch_pages(report_url)
+
+        # Step 4: Vectorize the investor report page by page; chunks never cross a page boundary
+        chunks = iter_page_chunks(pages, rag_processor.chunk_max_tokens, rag_processor.chunk_overlap_tokens)
+        items = (
+            (chunk, {"source": "investor_report", "metadata": {"meeting_id": meeting_id, "title": title, "page": page_number}})
+            for page_number, chunk in chunks
+        )
+        count = rag_processor.index_chunks(items, scope=scope)
+        logging.info(f"investor_report vectorized successfully with {count} chunks.")
 
-        return content  # Return extracted text for further processing
+        return "".join(pages)  # Return extracted text for further processing
 
     except Exception as e:
         logging.error(f"Error processing investor report: {e}")
         return ""
 
 
-def vectorize_data(data, source, meeting_id, title):
+def transcript_pdf_path(meeting_id):
+    return os.path.join(PDF_ARCHIVE_DIR, re.sub(r"[^\w.-]", "_", meeting_id) + ".pdf")
+
+
+def render_transcript_pdf(transcript_details, content, meeting_id):
+    """
+    Render the transcript PDF of meeting_id into the archive and return its path.
     """
-    Vectorize and store data in Qdrant with specified source.
+    with span("transcript_pdf"):
+        pdf_file_path = save_transcript_as_pdf(transcript_details, content, transcript_pdf_path(meeting_id))
+    logging.info(f"Transcript saved as PDF at: {pdf_file_path}")
+    return pdf_file_path
+
+
+def archive_done(future):
+    pdf_archive_slots.release()
+    if future.exception() is not None:
+        logging.error(f"Error archiving transcript PDF: {future.exception()}")
+
+
+def archive_transcript_pdf(transcript_details, content, meeting_id):
+    """
+    Queue the transcript PDF on the archive pool without waiting for it.
+    Returns False if too many archives are already pending; the PDF is then rendered on first request.
+    """
+    if not pdf_archive_slots.acquire(blocking=False):
+        logging.warning(f"PDF archive backlog full, transcript PDF of {meeting_id} will be rendered on request")
+        return False
+    future = pdf_executor.submit(render_transcript_pdf, dict(transcript_details), content, meeting_id)
+    future.add_done_callback(archive_done)
+    return True
+
+
+def render_transcript_pdf_on_request(meeting_id, api_key):
+    """
+    Fetch the transcript of meeting_id and render its PDF into the archive; returns None if there is no transcript.
+    """
+    pdf_file_path = transcript_pdf_path(meeting_id)
+    if os.path.exists(pdf_file_path):  # Finished by an earlier render since the request checked
+        return pdf_file_path
+    with dependency_span("fireflies", "transcript"):
+        transcript_details = fetch_transcript_details(meeting_id, api_key)
+    if not transcript_details:
+        return None
+    content = process_transcript_content(transcript_details)
+    return render_transcript_pdf(transcript_details, content, meeting_id)
+
+
+def vectorize_data(data, source, meeting_id, title, scope):
+    """
+    Vectorize and store data in the vector store with specified source, under the request's scope.
+    data is either raw text or an iterable of pre-built chunks (e.g. from iter_transcript_chunks).
     """
     try:
-        points = []
-        chunks = rag_processor.chunk_text(data)  # Split data into chunks
-
-        # Log data chunks
-        logging.info(f"Vectorizing {source} with {len(chunks)} chunks.")
-
-        for i, chunk in enumerate(chunks):
-            # Generate valid UUID for point ID
-            point_id = str(uuid.uuid4())
-            embedding = rag_processor.st_model.encode(chunk).tolist()
-
-            points.append({
-                "id": point_id,
-                "vector": embedding,
-                "payload": {
-                    "text": chunk,
-                    "source": source,
-                    "metadata": {"meeting_id": meeting_id, "title": title}
-                }
-            })
-
-        # Insert points into Qdrant
-        rag_processor.qdrant_client.upsert(collection_name="knowledge_base", points=points)
-        logging.info(f"{source} vectorized successfully with {len(points)} chunks.")
+        # Split data into chunks lazily; duplicates are dropped and batches encoded and upserted as they fill
+        chunks = rag_processor.iter_chunks(data) if isinstance(data, str) else data
+        fields = {"source": source, "metadata": {"meeting_id": meeting_id, "title": title}}
+        count = rag_processor.index_chunks(((chunk, fields) for chunk in chunks), scope=scope)
+
+        logging.info(f"{source} vectorized successfully with {count} chunks.")
 
     except Exception as e:
         logging.error(f"Error vectorizing {source}: {e}")
 
 
-def check_with_gpt(content, keyword):
+def check_with_gpt(content, keyword, usage=None, bypass_cache=False):
     """
     Use GPT API to determine if the meeting content mentions {keyword}.
     Handles large inputs by truncating content to fit GPT's token limit.
+    Token usage is added to usage when given.
     """
     try:
-        # Instantiate a new client for every request to ensure stateless interaction
-        client = openai.OpenAI() 
-
         # GPT API Request with improved prompt
         prompt = f"""
         Analyze the following text to determine if it explicitly or implicitly refers to {keyword}. 
@@ -117,18 +198,21 @@ def check_with_gpt(content, keyword):
         4. Respond 'YES' if the text contains any mention of {keyword}.
         5. Respond 'NO' if no mention is present, and explain why.
         """
-        response = client.chat.completions.create(
+        response = chat_completion(
+            "check_with_gpt",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": f"You are an assistant analyzing text for mentions of {keyword}. DO NOT USE BACK ANY PREVIOUS INFORMATION OR ANSWERS"},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=300, 
-            temperature=0.2
+            temperature=0.2,
+            bypass_cache=bypass_cache
         )
+        add_usage(usage, response)
 
         # Process GPT response
-        gpt_reply = response.choices[0].message.content.strip()
+        gpt_reply = response.content.strip()
         logging.info(f"GPT Analysis: {gpt_reply}")
 
         # Decision
@@ -146,100 +230,182 @@ class FlowType(Enum):
     NO_NDA_NO_DR_YES_PRENDA = "Pre-NDA"
     NO_NDA_NO_DR_NO_PRENDA = "No specific flow"
 
-def logic_block(content,roles):
+def timed_check(timings, name, check, *args):
+    """
+    Run a flow check and record its duration in seconds under timings[name].
+    """
+    start = time.perf_counter()
+    try:
+        return check(*args)
+    finally:
+        timings[name] = round(time.perf_counter() - start, 3)
+
+
+def logic_block(content,roles,scope=None,detection_mode=None,bypass_cache=False):
     """
     Check the type of workflow based on content and title.
+    content is the meeting content as one string or as a list of sections; see budgeted_context.
+    In "multi" mode the NDA, data room and pre-NDA checks run concurrently; as before, the pre-NDA
+    result only decides the flow when no data room was mentioned, and is discarded otherwise.
+    In "consolidated" mode a single call returns all three verdicts and the scenario for each flow.
+    Returns the check results and a report of the mode, per-check timings and token usage.
+    A discarded pre-NDA check that already ran is not waited for; its timings and usage are logged when it finishes.
+    bypass_cache sends every GPT call of the checks and the selected flow to the API, skipping the response cache.
     """
-    nda_mentioned, nda_gpt_analysis, nda_retrieved_context = check_NDA(content)
-    dataroom_mentioned, dataroom_gpt_analysis, dataroom_retrieved_context = check_dataroom(content)
+    detection_mode = detection_mode or DETECTION_MODE
+    timings = {}
+    usage = {}
+    discarded = {}
+    start = time.perf_counter()
+
+    # Retrieve context for every flow query in one round trip
+    flow_results = rag_processor.search_contexts(FLOW_QUERIES, top_k=FLOW_TOP_K, scope=scope)
+    timings["retrieval"] = round(time.perf_counter() - start, 3)
+
+    if detection_mode == "consolidated":
+        verdicts, scenarios = timed_check(timings, "detection", check_flows, content, roles, flow_results, usage, bypass_cache)
+        nda_mentioned, nda_gpt_analysis, nda_retrieved_context = verdicts["nda"]
+        dataroom_mentioned, dataroom_gpt_analysis, dataroom_retrieved_context = verdicts["dataroom"]
+        get_prenda = lambda: verdicts["prenda"]
+        discard_prenda = lambda: None
+    else:
+        # Fan out all three checks; pre-NDA is speculative and dropped when the data room branch wins.
+        # Each runs in a copy of this context so its spans land in the job's trace.
+        nda_future = check_executor.submit(contextvars.copy_context().run, timed_check, timings, "nda", check_NDA, content, scope, flow_results[NDA_QUERY], usage, bypass_cache)
+        dataroom_future = check_executor.submit(contextvars.copy_context().run, timed_check, timings, "dataroom", check_dataroom, content, scope, flow_results[DATAROOM_QUERY], usage, bypass_cache)
+        # The speculative check keeps its own timings and usage, merged into the job's only when its result is used
+        prenda_timings, prenda_usage = {}, {}
+        prenda_future = check_executor.submit(contextvars.copy_context().run, timed_check, prenda_timings, "prenda", check_prenda, content, scope, flow_results[PRENDA_QUERY], prenda_usage, bypass_cache)
+
+        nda_mentioned, nda_gpt_analysis, nda_retrieved_context = nda_future.result()
+        dataroom_mentioned, dataroom_gpt_analysis, dataroom_retrieved_context = dataroom_future.result()
+        scenarios = {}
+
+        def get_prenda():
+            try:
+                return prenda_future.result()
+            finally:
+                timings.update(prenda_timings)
+                for key, value in prenda_usage.items():
+                    usage[key] = usage.get(key, 0) + value
+
+        def discard_prenda():
+            if not prenda_future.cancel():
+                discarded["prenda"] = prenda_future
+
     selected_flow = FlowType.NO_NDA_NO_DR_NO_PRENDA 
+    prenda_mentioned, prenda_gpt_analysis = None, None
 
     if nda_mentioned:
         if dataroom_mentioned:
             logging.info("data room flow entered")
             selected_flow = FlowType.YES_NDA_YES_DR
-            dataroom_flow(selected_flow,dataroom_retrieved_context,roles)
+            discard_prenda()
+            dataroom_flow(selected_flow,dataroom_retrieved_context,roles,scenarios.get("dataroom"),usage,bypass_cache)
         else:
-            prenda_mentioned, prenda_gpt_analysis, prenda_retrieved_context = check_prenda(content)
+            prenda_mentioned, prenda_gpt_analysis, prenda_retrieved_context = get_prenda()
             if prenda_mentioned:
                 logging.info("pre NDA flow entered")
                 selected_flow = FlowType.YES_NDA_NO_DR_YES_PRENDA
-                prenda_flow(selected_flow,prenda_retrieved_context,roles)
+                prenda_flow(selected_flow,prenda_retrieved_context,roles,scenarios.get("prenda"),usage,bypass_cache)
 
             else:
                 logging.info("NDA facilitation flow entered")
                 selected_flow = FlowType.YES_NDA_NO_DR_NO_PRENDA
-                nda_flow(selected_flow,nda_retrieved_context,roles)
+                nda_flow(selected_flow,nda_retrieved_context,roles,scenarios.get("nda"),usage,bypass_cache)
     else:
         if dataroom_mentioned:
             logging.info("data room flow entered")
             selected_flow = FlowType.NO_NDA_YES_DR
-            dataroom_flow(selected_flow,dataroom_retrieved_context,roles)
+            discard_prenda()
+            dataroom_flow(selected_flow,dataroom_retrieved_context,roles,scenarios.get("dataroom"),usage,bypass_cache)
         else:
-            prenda_mentioned, prenda_gpt_analysis, prenda_retrieved_context = check_prenda(content)
+            prenda_mentioned, prenda_gpt_analysis, prenda_retrieved_context = get_prenda()
             if prenda_mentioned:
                 logging.info("pre NDA flow entered")
                 selected_flow = FlowType.NO_NDA_NO_DR_YES_PRENDA
-                prenda_flow(selected_flow,prenda_retrieved_context,roles)
+                prenda_flow(selected_flow,prenda_retrieved_context,roles,scenarios.get("prenda"),usage,bypass_cache)
 
             else:
                 logging.info("No specific flow entered")
                 
+    timings["total"] = round(time.perf_counter() - start, 3)
+    report = {"mode": detection_mode, "flow": selected_flow.value, "timings": timings, "usage": usage}
+    logging.info(f"Flow checks: {report}")
+    if discarded:
+        # Already running when dropped, so its tokens are spent anyway; record them once it's done
+        # instead of holding the job for a result nobody uses
+        trace_id = current_trace_id()
+        discarded["prenda"].add_done_callback(lambda future: logging.info(
+            f"[trace {trace_id or '-'}] Discarded pre-NDA check finished: timings {prenda_timings}, usage {prenda_usage}"
+        ))
+
+    return nda_mentioned, nda_gpt_analysis, dataroom_mentioned, dataroom_gpt_analysis, prenda_mentioned, prenda_gpt_analysis, report
+
+def send_follow_up_email(recipient_email, subject, email_body):
+    """
+    Send the follow-up email through the Outlook API, once per meeting event: a re-run of the job
+    (expired lease, or a retry after a failure later in the pipeline) finds the job's marker and skips it.
+    """
+    job_id = current_job_id.get()
+    if job_id and job_queue.email_sent(job_id):
+        logging.warning(f"Follow-up email for job {job_id} was already sent, not sending it again")
+        return
 
-    return nda_mentioned, nda_gpt_analysis, dataroom_mentioned, dataroom_gpt_analysis, prenda_mentioned, prenda_gpt_analysis
+    with dependency_span("outlook", "send_email"):
+        token = get_access_token_outlook()  
+        send_email(token, recipient_email, subject, email_body)
+    if job_id:
+        job_queue.mark_email_sent(job_id)
 
-def nda_flow(selected_flow, retrieved_context,roles):
-    scenario = classify_context(selected_flow,retrieved_context,roles)
+    logging.info("Email sent successfully!")
+
+@flow_span("nda_flow")
+def nda_flow(selected_flow, retrieved_context,roles,scenario=None,usage=None,bypass_cache=False):
+    # The consolidated detection call already classified the scenario
+    if scenario is None:
+        scenario = classify_context(selected_flow,retrieved_context,roles,usage,bypass_cache)
     
     # Use OpenAI to generate an email body
-    email_body = generate_email_body(scenario, roles)
+    email_body = generate_email_body(scenario, roles, bypass_cache)
 
     recipient_email = 'xxxx'  
     subject = f"Follow-up on {scenario}" 
 
-    # Send email using Outlook API
-    token = get_access_token_outlook()  
-    send_email(token, recipient_email, subject, email_body)
-
-    logging.info("Email sent successfully!")
+    send_follow_up_email(recipient_email, subject, email_body)
 
-def prenda_flow(selected_flow, retrieved_context,roles):
-    scenario = classify_context(selected_flow,retrieved_context,roles)
+@flow_span("prenda_flow")
+def prenda_flow(selected_flow, retrieved_context,roles,scenario=None,usage=None,bypass_cache=False):
+    # The consolidated detection call already classified the scenario
+    if scenario is None:
+        scenario = classify_context(selected_flow,retrieved_context,roles,usage,bypass_cache)
 
     # Use OpenAI to generate an email body
-    email_body = generate_email_body(scenario, roles)
+    email_body = generate_email_body(scenario, roles, bypass_cache)
 
     recipient_email = 'xxxx'  
     subject = f"Follow-up on {scenario}" 
 
-    # Send email using Outlook API
-    token = get_access_token_outlook()  
-    send_email(token, recipient_email, subject, email_body)
-
-    logging.info("Email sent successfully!")
+    send_follow_up_email(recipient_email, subject, email_body)
 
-def dataroom_flow(selected_flow, retrieved_context,roles):
-    scenario = classify_context(selected_flow,retrieved_context,roles)
+@flow_span("dataroom_flow")
+def dataroom_flow(selected_flow, retrieved_context,roles,scenario=None,usage=None,bypass_cache=False):
+    # The consolidated detection call already classified the scenario
+    if scenario is None:
+        scenario = classify_context(selected_flow,retrieved_context,roles,usage,bypass_cache)
 
     # Use OpenAI to generate an email body
-    email_body = generate_email_body(scenario, roles)
+    email_body = generate_email_body(scenario, roles, bypass_cache)
 
     recipient_email = 'xxxx'  
     subject = f"Follow-up on {scenario}" 
 
-    # Send email using Outlook API
-    token = get_access_token_outlook()  
-    send_email(token, recipient_email, subject, email_body)
+    send_follow_up_email(recipient_email, subject, email_body)
 
-    logging.info("Email sent successfully!")
-
-def generate_email_body(scenario, roles):
+def generate_email_body(scenario, roles, bypass_cache=False):
     """
     Generates email content using GPT based on scenario and roles.
     """
-    # Instantiate a new client for every request to prevent memory carryover
-    client = openai.OpenAI()
-
     prompt = f"""
     Write a professional email based on the following scenario:
 
@@ -276,16 +442,18 @@ def generate_email_body(scenario, roles):
 
     try:
 
-        response = client.chat.completions.create(
+        response = chat_completion(
+            "generate_email_body",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an AI email assistant creating professional emails based on context. DO NOT USE BACK ANY PREVIOUS INFORMATION OR ANSWERS"},
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            bypass_cache=bypass_cache
         )
 
         # Extract and clean up email body
-        email_body = response.choices[0].message.content.strip()
+        email_body = response.content.strip()
 
         # Ensure no additional formatting like HTML tags or code blocks
         email_body = email_body.replace("```html", "").replace("```", "").strip()
@@ -298,59 +466,243 @@ def generate_email_body(scenario, roles):
 
 
 
-def check_NDA(content):
-    query = "NDA or Non-Disclosure Agreement"
-    vectorized_results = rag_processor.search_context(query, top_k=3)
-    retrieved_context = "\n".join([res['text'] for res in vectorized_results]) + "\n" + content
+def budgeted_context(vectorized_results, content):
+    """
+    Retrieved chunks, best score first, then the meeting content, cut to PROMPT_CONTEXT_TOKENS.
+    content is a string or a list of sections taken in order, each kept, cut or dropped on its own.
+    """
+    content_sections = [content] if isinstance(content, str) else content
+    sections = [(res['text'], res['score']) for res in vectorized_results] + [(text, None) for text in content_sections]
+    retrieved_context, report = build_context(sections, PROMPT_CONTEXT_TOKENS)
+    logging.info(f"Prompt context: {report}")
+    return retrieved_context
+
+def check_NDA(content, scope=None, vectorized_results=None, usage=None, bypass_cache=False):
+    if vectorized_results is None:
+        vectorized_results = rag_processor.search_context(NDA_QUERY, top_k=FLOW_TOP_K, scope=scope)
+    retrieved_context = budgeted_context(vectorized_results, content)
     keyword = "NDA (non-disclosure agreement)"
 
-    nda_mentioned, nda_gpt_analysis = check_with_gpt(retrieved_context,keyword=keyword)
+    nda_mentioned, nda_gpt_analysis = check_with_gpt(retrieved_context,keyword=keyword,usage=usage,bypass_cache=bypass_cache)
     return nda_mentioned, nda_gpt_analysis, retrieved_context
 
-def check_dataroom(content):
-    query = "data room or dataroom"
-    vectorized_results = rag_processor.search_context(query, top_k=3)
-    retrieved_context = "\n".join([res['text'] for res in vectorized_results]) + "\n" + content
+def check_dataroom(content, scope=None, vectorized_results=None, usage=None, bypass_cache=False):
+    if vectorized_results is None:
+        vectorized_results = rag_processor.search_context(DATAROOM_QUERY, top_k=FLOW_TOP_K, scope=scope)
+    retrieved_context = budgeted_context(vectorized_results, content)
     keyword = "data room"
 
-    dataroom_mentioned, dataroom_gpt_analysis = check_with_gpt(retrieved_context,keyword=keyword)
+    dataroom_mentioned, dataroom_gpt_analysis = check_with_gpt(retrieved_context,keyword=keyword,usage=usage,bypass_cache=bypass_cache)
     return dataroom_mentioned, dataroom_gpt_analysis, retrieved_context
 
-def check_prenda(content):
+def check_prenda(content, scope=None, vectorized_results=None, usage=None, bypass_cache=False):
     """
     Check for mentions of supporting documents or additional information related to pre-NDA flow.
     """
-    query = "supporting documents or more information"
-    vectorized_results = rag_processor.search_context(query, top_k=3)
+    if vectorized_results is None:
+        vectorized_results = rag_processor.search_context(PRENDA_QUERY, top_k=FLOW_TOP_K, scope=scope)
     
-    # Combine all retrieved contexts
-    retrieved_context = "\n".join([res['text'] for res in vectorized_results]) + "\n" + content
+    # Combine retrieved contexts and content within the prompt budget
+    retrieved_context = budgeted_context(vectorized_results, content)
     
     # Keyword analysis
     keyword = "supporting documents or more information for the company from the investor"
-    prenda_mentioned, prenda_gpt_analysis = check_with_gpt(retrieved_context, keyword=keyword)
+    prenda_mentioned, prenda_gpt_analysis = check_with_gpt(retrieved_context, keyword=keyword, usage=usage, bypass_cache=bypass_cache)
 
     # Return retrieved context along with results
     return prenda_mentioned, prenda_gpt_analysis, retrieved_context
 
+def check_flows(content, roles, flow_results, usage=None, bypass_cache=False):
+    """
+    Consolidated detection: send the retrieved context and content once and get verdicts for all three flows.
+    Returns ({flow: (mentioned, analysis, retrieved_context)}, {flow: scenario JSON for the email}).
+    """
+    # Each retrieved chunk once, at its best rank across the queries. Merged by rank, not score: a query's
+    # scores may be cosine, BM25 or fused, depending on how it was answered, and don't compare across queries
+    best = {}
+    for query in FLOW_QUERIES:
+        for rank, res in enumerate(flow_results[query], start=1):
+            if res['text'] not in best or rank < best[res['text']][0]:
+                best[res['text']] = (rank, res)
+    merged = [{**res, 'score': 1.0 / rank} for rank, res in best.values()]
+    retrieved_context = budgeted_context(merged, content)
+
+    detection = detect_flows(retrieved_context, roles, usage, bypass_cache)
+    verdicts, scenarios = {}, {}
+    for flow in DETECTION_FLOWS:
+        verdict = detection[flow]
+        verdicts[flow] = (verdict["mentioned"], verdict["reasoning"], retrieved_context)
+        scenarios[flow] = json.dumps({key: verdict[key] for key in ("scenario", "reason", "quote")})
+    return verdicts, scenarios
+
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics: per-stage, per-dependency and per-flow latency histograms and counters.
+    """
+    body, content_type = render_metrics()
+    return Response(body, mimetype=content_type)
+
+
+@app.route('/stats/embedding-cache', methods=['GET'])
+def embedding_cache_stats():
+    """
+    Report hit/miss counters of the embedding cache.
+    """
+    return jsonify(rag_processor.embedding_cache_stats()), 200
+
+
+@app.route('/stats/report-cache', methods=['GET'])
+def report_cache_stats():
+    """
+    Report investor report downloads, revalidations and text extractions.
+    """
+    return jsonify({**report_fetcher.stats, **report_fetcher.cache.stats()}), 200
+
+
+@app.route('/stats/llm-cache', methods=['GET'])
+def llm_cache_stats_route():
+    """
+    Report LLM response cache hits, misses and bypasses per GPT call site.
+    """
+    return jsonify(llm_cache_stats()), 200
+
+
+@app.route('/stats/llm-client', methods=['GET'])
+def llm_client_stats_route():
+    """
+    Report OpenAI requests, retries, 429s and time spent waiting on the client-side rate limiter.
+    """
+    return jsonify(llm_client_stats()), 200
 
 
 @app.route('/<user>/fireflies', methods=['POST'])
 def handle_webhook(user):
     """
-    Webhook endpoint to process transcripts, meeting notes, investor reports, and check for NDA mentions.
+    Webhook endpoint: validate the event, queue it for processing, and return 202 immediately.
+    Idempotent per meetingId and eventType: a meeting already processed returns its stored result (200),
+    and a duplicate of a queued or running job is coalesced onto it. ?force=1 reprocesses anyway
+    (the follow-up email of a meeting event is still sent only once).
+    """
+    # Every response carries a trace ID: a new job is processed under this one, a coalesced or completed
+    # request returns the trace ID of the job that answers it
+    trace_id = request.headers.get('X-Request-ID') or new_trace_id()
+    data = request.json or {}
+    meeting_id = data.get('meetingId')
+    event_type = data.get('eventType')
+
+    if not meeting_id or event_type != 'Transcription completed':
+        return jsonify({'error': 'Invalid data', 'trace_id': trace_id}), 400
+
+    # ?detection_mode=multi|consolidated overrides DETECTION_MODE for A/B runs
+    job = {'user': user, 'meeting_id': meeting_id, 'event_type': event_type, 'trace_id': trace_id}
+    detection_mode = request.args.get('detection_mode')
+    if detection_mode:
+        if detection_mode not in ('multi', 'consolidated'):
+            return jsonify({'error': 'Invalid detection_mode', 'trace_id': trace_id}), 400
+        job['detection_mode'] = detection_mode
+
+    force = request.args.get('force') in ('1', 'true')
+    if force:
+        # Reprocess for real: the GPT verdicts and email would otherwise replay from the response cache
+        job['bypass_cache'] = True
+    queued, created = job_queue.enqueue_once(meeting_id, f"{meeting_id}:{event_type}", job, force=force)
+    status_url = f'/jobs/{meeting_id}'
+    if not created:
+        # The request is answered by the existing job, so its trace is the one to follow
+        trace_id = queued['payload'].get('trace_id', trace_id)
+
+    if not created and queued['status'] == 'done':
+        logging.info(f"Meeting {meeting_id} already processed by job {queued['job_id']}, returning stored result")
+        return jsonify({'status': 'completed', 'job_id': queued['job_id'], 'result': queued['result'], 'status_url': status_url, 'trace_id': trace_id}), 200
+    if not created:
+        logging.info(f"Duplicate webhook for meeting {meeting_id} coalesced onto job {queued['job_id']}")
+        return jsonify({'status': queued['status'], 'job_id': queued['job_id'], 'coalesced': True, 'status_url': status_url, 'trace_id': trace_id}), 202
+
+    logging.info(f"Queued job {queued['job_id']} for meeting {meeting_id}")
+    return jsonify({'status': 'queued', 'job_id': queued['job_id'], 'status_url': status_url, 'trace_id': trace_id}), 202
+
+
+@app.route('/jobs/<meeting_id>', methods=['GET'])
+def job_status(meeting_id):
+    """
+    Status of the latest job for a meeting (with its result once done), plus earlier attempts.
     """
-    # Acquire lock to process one request at a time
-    if not request_lock.acquire(blocking=False):  # Non-blocking mode
-        logging.warning("Another request is already being processed.")
-        return jsonify({'error': 'Server is busy processing another request. Please try again later.'}), 429
+    jobs = job_queue.jobs_for_meeting(meeting_id)
+    if not jobs:
+        return jsonify({'error': 'No jobs for this meeting'}), 404
+    return jsonify({**jobs[0], 'history': jobs[1:]}), 200
 
-    try:
-        # Reset Qdrant collection for each POST request to clear any previous data
-        rag_processor.reset_collection()  # Clears and recreates collection
-        logging.info("Qdrant collection reset successfully.")
 
-        # Clear variables for each POST request
+@app.route('/<user>/transcripts/<meeting_id>.pdf', methods=['GET'])
+def transcript_pdf(user, meeting_id):
+    """
+    The archived transcript PDF of a meeting. If it hasn't been rendered yet (lazy mode, or a skipped
+    background archive), the transcript is fetched and rendered once, then kept on disk; concurrent
+    requests for the same meeting wait for that render.
+    """
+    pdf_file_path = transcript_pdf_path(meeting_id)
+    if not os.path.exists(pdf_file_path):
+        try:
+            api_key = get_access_token(f'/{user}/fireflies')
+        except ValueError:
+            return jsonify({'error': 'Unknown user'}), 404
+
+        with pdf_renders_lock:
+            render = pdf_renders.get(meeting_id)
+            leader = render is None
+            if leader:
+                if len(pdf_renders) >= PDF_RENDER_MAX_INFLIGHT:
+                    return jsonify({'error': 'Too many transcript PDFs rendering, retry shortly'}), 503, {'Retry-After': '5'}
+                render = pdf_renders[meeting_id] = Future()
+        if leader:
+            try:
+                render.set_result(render_transcript_pdf_on_request(meeting_id, api_key))
+            except Exception as e:
+                render.set_exception(e)
+            finally:
+                with pdf_renders_lock:
+                    del pdf_renders[meeting_id]
+
+        pdf_file_path = render.result()
+        if not pdf_file_path:
+            return jsonify({'error': 'Transcript not found'}), 404
+    return send_file(os.path.abspath(pdf_file_path), mimetype='application/pdf')
+
+
+def process_meeting(job):
+    """
+    Process a queued Fireflies event under the trace ID handed out with the webhook response.
+    Returns the job result, with the trace ID and per-stage spans; raises on failure.
+    """
+    current_job_id.set(job.get('job_id'))
+    with trace(job.get('trace_id')) as current:
+        try:
+            result = run_pipeline(job)
+        except Exception:
+            JOBS_TOTAL.labels("failed").inc()
+            raise
+        JOBS_TOTAL.labels(result['status']).inc()
+        return {**result, 'trace_id': current['trace_id'], 'spans': current['spans']}
+
+
+def run_pipeline(job):
+    """
+    Fetch the transcript, meeting notes and investor report, and run the NDA checks.
+    Every stage is timed with a span.
+    """
+    user = job['user']
+    meeting_id = job['meeting_id']
+    # Set on the job to send every GPT call to the API instead of answering from the response cache
+    bypass_cache = job.get('bypass_cache', False)
+
+    # Points indexed by this job live under their own scope, so concurrent meetings don't collide
+    scope = f"{meeting_id}:{uuid.uuid4().hex}"
+
+    try:
+        # Clear variables for each job
         content = ""
         roles = []  
         notes = []
@@ -358,74 +710,96 @@ def handle_webhook(user):
         investor_report = None
 
         # Step 1: Get API key based on user
-        api_key = get_access_token(f'/{user}/fireflies')
-        data = request.json
-
-        # Step 2: Validate incoming data
-        meeting_id = data.get('meetingId')
-        event_type = data.get('eventType')
-
-        if not meeting_id or event_type != 'Transcription completed':
-            return jsonify({'error': 'Invalid data'}), 400
+        with dependency_span("fireflies", "access_token"):
+            api_key = get_access_token(f'/{user}/fireflies')
 
         # Step 3: Fetch transcript details
-        transcript_details = fetch_transcript_details(meeting_id, api_key)
+        with dependency_span("fireflies", "transcript"):
+            transcript_details = fetch_transcript_details(meeting_id, api_key)
         if not transcript_details:
-            logging.error("Transcript details not found.")
-            return jsonify({'error': 'Transcript details not found'}), 400
+            raise Exception("Transcript details not found")
 
         # Extract transcript content and metadata
-        content = process_transcript_content(transcript_details)
-        speakers = get_transcript_speakers(transcript_details)
-        title = transcript_details.get('title', 'Untitled Transcript')
-
-        # Save transcript as PDF
-        pdf_file_path = save_transcript_as_pdf(transcript_details, content)
-        logging.info(f"Transcript saved as PDF at: {pdf_file_path}")
+        with span("transcript_processing"):
+            # One pass over the sentences; the rendered text, speakers and chunks all come from it
+            transcript = CompactTranscript.from_fireflies(transcript_details)
+            # The compact form holds everything the pipeline needs from the raw sentence dicts
+            transcript_details.pop('sentences', None)
+            content = transcript.render()
+            transcript_content = content
+            speakers = list(transcript.speakers)
+            title = transcript_details.get('title', 'Untitled Transcript')
+
+        # Archive the transcript as PDF in the background; nothing later in the job needs it
+        if PDF_ARCHIVE_MODE == "background":
+            archive_transcript_pdf(transcript_details, content, meeting_id)
 
         # Rule 1 check using GPT analysis
-        rule1_passed, analysis = analyze_transcript_with_gpt(content, title)
+        with span("rule_check"):
+            rule1_passed, analysis = analyze_transcript_with_gpt(content, title, bypass_cache=bypass_cache)
 
         if not rule1_passed:
             logging.warning(f"Rule failed for title: {title}")
-            return jsonify({'status': 'logged', 'analysis': analysis}), 200
+            return {'status': 'logged', 'analysis': analysis}
 
         # Step 4: Retrieve meeting details, notes, and investor report
-        result = get_meeting_details_and_notes_by_fuzzy_title(title)
+        with dependency_span("mysql", "meeting_lookup"):
+            result = get_meeting_details_and_notes_by_fuzzy_title(title)
         meeting_details = result.get('meeting_details', {})
         notes = result.get('notes', [])
         investor_report = result.get('investor_report')
 
         # Step 5: Vectorize data
-        vectorize_data(content, "transcripts", meeting_id, title)
+        # Chunk the transcript on speaker turns rather than the rendered text
+        with span("vectorize_transcript"):
+            transcript_chunks = iter_transcript_chunks(
+                transcript, rag_processor.chunk_max_tokens, rag_processor.chunk_overlap_tokens
+            )
+            vectorize_data(transcript_chunks, "transcripts", meeting_id, title, scope)
 
         # Process meeting details
+        details_section = notes_section = report_section = ""
         if meeting_details:
             detail_content = f"Title: {meeting_details['title']}\nScheduled Time: {meeting_details['scheduled_time']}\n"
-            vectorize_data(detail_content, "meeting_details", meeting_id, title)
-            content += "\n\nMeeting Details:\n" + detail_content
+            with span("vectorize_meeting_details"):
+                vectorize_data(detail_content, "meeting_details", meeting_id, title, scope)
+            details_section = "Meeting Details:\n" + detail_content
+            content += "\n\n" + details_section
 
         # Process meeting notes
         if notes:
             notes_content = "\n".join(notes)
-            vectorize_data(notes_content, "meeting_notes", meeting_id, title)
-            content += "\n\nMeeting Notes:\n" + notes_content
+            with span("vectorize_notes"):
+                vectorize_data(notes_content, "meeting_notes", meeting_id, title, scope)
+            notes_section = "Meeting Notes:\n" + notes_content
+            content += "\n\n" + notes_section
 
         # Process investor report
         report_content = ""
         if investor_report:
-            report_content = process_investor_report(investor_report, meeting_id, title)
-            vectorize_data(report_content, "investor_report", meeting_id, title)
-            content += "\n\nInvestor Report:\n" + report_content
+            with span("investor_report"):
+                report_content = process_investor_report(investor_report, meeting_id, title, scope)
+            report_section = "Investor Report:\n" + report_content
+            content += "\n\n" + report_section
+
+        # Flow checks budget the content section by section: the short details and notes first,
+        # then the transcript, and the investor report is the first to be cut
+        flow_content = [details_section, notes_section, transcript_content, report_section]
 
         # Role Identification Step
-        roles = role_identifier(content, notes, report_content, meeting_details, speakers)
+        with span("role_identification"):
+            roles = role_identifier(content, notes, report_content, meeting_details, speakers, bypass_cache=bypass_cache)
 
         # Step 6: Analyze with logic block
-        nda_mentioned, nda_gpt_analysis, dataroom_mentioned, dataroom_gpt_analysis, prenda_mentioned, prenda_gpt_analysis = logic_block(content, roles)
+        with span("flow_checks"):
+            nda_mentioned, nda_gpt_analysis, dataroom_mentioned, dataroom_gpt_analysis, prenda_mentioned, prenda_gpt_analysis, checks_report = logic_block(flow_content, roles, scope, job.get('detection_mode'), bypass_cache)
+
+        # Chunks and encodes saved by deduplication in this job
+        dedup_report = rag_processor.dedup_report(scope)
+        logging.info(f"Deduplication: {dedup_report}")
 
-        # Step 7: Return response
-        return jsonify({
+        # Step 7: Return result
+        return {
             'status': 'success',
             'Rule analysis': analysis,
             'nda_mentioned': nda_mentioned,
@@ -439,20 +813,35 @@ def handle_webhook(user):
                 'title': title,
                 'meeting_details': meeting_details,
                 'notes': notes,
-                'investor_report': investor_report
+                'investor_report': investor_report,
+                'transcript_pdf': f'/{user}/transcripts/{meeting_id}.pdf'
             },
-            "gpt analysis for role identification": roles
-        }), 200
-
-    except Exception as e:
-        logging.error(f"Error: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
+            "gpt analysis for role identification": roles,
+            "dedup": dedup_report,
+            "checks": checks_report
+        }
 
     finally:
-        # Release lock after completion
-        request_lock.release()
+        # Drop this job's points; anything missed is collected once the scope expires
+        with span("cleanup"):
+            rag_processor.delete_scope(scope)
+
+
+# The Werkzeug reloader imports this module in a watcher process as well as in the serving process;
+# only the serving process may run workers on the shared queue. Whether debug (and so the reloader) is on
+# isn't known yet at import under "flask run", so there the workers start with the first request, which
+# only the serving process handles, unless the reloader already marked this process as the serving one
+worker_pool = WorkerPool(job_queue, process_meeting, workers=JOB_WORKERS)
+if not SPAWNED_HELPER and (os.getenv("FLASK_RUN_FROM_CLI") != "true" or os.getenv("WERKZEUG_RUN_MAIN") == "true"):
+    worker_pool.start()
+
+
+@app.before_request
+def start_workers():
+    worker_pool.start()
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # No reloader: the watcher process would import this module a second time
+    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
 
@@ -0,0 +1,66 @@
+import math
+import os
+from functools import lru_cache
+
+import tiktoken
+
+# Prompt context budgets, in model tokens
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", 6000))  # flow checks and detection
+TRIAGE_CONTEXT_TOKENS = int(os.getenv("TRIAGE_CONTEXT_TOKENS", 1000))  # analyze_transcript_with_gpt
+ROLE_CONTEXT_TOKENS = int(os.getenv("ROLE_CONTEXT_TOKENS", 3000))  # investor report in role_identifier
+# A section is cut down to the remaining budget only if at least this much of it still fits
+MIN_SECTION_TOKENS = 64
+
+
+@lru_cache(maxsize=None)
+def encoding_for(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text, model="gpt-4o"):
+    return len(encoding_for(model).encode(text or "", disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, model="gpt-4o"):
+    """Return the longest prefix of text that is at most max_tokens tokens."""
+    encoding = encoding_for(model)
+    tokens = encoding.encode(text or "", disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(max_tokens, 0)])
+
+
+def build_context(sections, budget, model="gpt-4o", separator="\n"):
+    """
+    Assemble prompt context from (text, score) sections within budget tokens.
+    Sections are taken highest score first (None ranks last, in the given order); whole sections are
+    added while they fit, and the first one that doesn't is cut to the remaining budget.
+    Returns (context, report) where report counts the tokens and sections included, truncated and dropped.
+    """
+    ranked = sorted(
+        (section for section in sections if section[0]),
+        key=lambda section: -math.inf if section[1] is None else section[1],
+        reverse=True,
+    )
+    separator_tokens = count_tokens(separator, model)
+    parts = []
+    report = {"tokens": 0, "included": 0, "truncated": 0, "dropped": 0}
+    remaining = budget
+    for text, _ in ranked:
+        joint = separator_tokens if parts else 0
+        cost = count_tokens(text, model) + joint
+        if cost <= remaining:
+            parts.append(text)
+            remaining -= cost
+            report["included"] += 1
+        elif remaining - joint >= MIN_SECTION_TOKENS:
+            parts.append(truncate_tokens(text, remaining - joint, model))
+            remaining = 0
+            report["truncated"] += 1
+        else:
+            report["dropped"] += 1
+    report["tokens"] = budget - remaining
+    return separator.join(parts), report
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import fitz  # PyMuPDF for PDF processing
+import requests
+
+from cache_utils import DiskCache
+from metrics import dependency_span
+
+# Extracted report text, keyed by URL and revalidated with ETag / Last-Modified
+REPORT_CACHE_PATH = os.getenv("REPORT_CACHE_PATH", os.path.join("cache", "reports.sqlite3"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Downloads larger than this are refused
+REPORT_MAX_BYTES = int(os.getenv("REPORT_MAX_BYTES", 50 * 1024 * 1024))
+REPORT_CONNECT_TIMEOUT_SECONDS = float(os.getenv("REPORT_CONNECT_TIMEOUT_SECONDS", 10))
+REPORT_READ_TIMEOUT_SECONDS = float(os.getenv("REPORT_READ_TIMEOUT_SECONDS", 60))
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class ReportTooLarge(Exception):
+    pass
+
+
+def extract_pdf_pages(data):
+    """Extract the text of every page of a PDF held in memory."""
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return [page.get_text() for page in doc]
+
+
+class ReportFetcher:
+    """
+    Downloads investor reports and returns the text of their pages, fetching and extracting each report only once.
+    Cached reports are revalidated with a conditional GET; a 304, or a body identical to the
+    cached one, reuses the stored text.
+    """
+
+    def __init__(self, cache_path=REPORT_CACHE_PATH, max_bytes=REPORT_MAX_BYTES):
+        self.cache = DiskCache(cache_path, max_entries=10_000, max_bytes=REPORT_CACHE_MAX_BYTES)
+        self.max_bytes = max_bytes
+        self.session = requests.Session()  # keep-alive connections to report hosts
+        self.stats = {"downloads": 0, "not_modified": 0, "unchanged": 0, "extractions": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _download(self, response):
+        """Read a streamed response body, refusing anything over max_bytes."""
+        length = response.headers.get("Content-Length")
+        if length and int(length) > self.max_bytes:
+            raise ReportTooLarge(f"Report is {length} bytes, limit is {self.max_bytes}")
+        data = bytearray()
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+            data.extend(chunk)
+            if len(data) > self.max_bytes:
+                raise ReportTooLarge(f"Report exceeds {self.max_bytes} bytes")
+        return bytes(data)
+
+    def fetch_pages(self, url):
+        key = self.key(url)
+        cached = self.cache.get(key)
+        entry = json.loads(cached) if cached else None
+        if entry and "pages" not in entry:
+            entry = None  # Cached before pages were kept apart; extract again
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        with dependency_span("report_host", "download"), self.session.get(
+            url,
+            headers=headers,
+            stream=True,
+            timeout=(REPORT_CONNECT_TIMEOUT_SECONDS, REPORT_READ_TIMEOUT_SECONDS),
+        ) as response:
+            if response.status_code == 304 and entry:
+                self._count("not_modified")
+                logging.info(f"Investor report not modified, using cached text: {url}")
+                return entry["pages"]
+            if response.status_code != 200:
+                raise Exception(f"Failed to download report: {response.status_code}")
+            data = self._download(response)
+            self._count("downloads")
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        digest = hashlib.sha256(data).hexdigest()
+        if entry and entry.get("sha256") == digest:
+            self._count("unchanged")
+            pages = entry["pages"]
+        else:
+            self._count("extractions")
+            with dependency_span("pdf", "extract"):
+                pages = extract_pdf_pages(data)
+
+        self.cache.set(key, json.dumps({
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": digest,
+            "pages": pages,
+        }).encode("utf-8"))
+        return pages
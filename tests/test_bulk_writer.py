@@ -0,0 +1,83 @@
+import threading
+
+import numpy as np
+import pytest
+
+from vector_store import BulkWriter
+
+
+class FailingStore:
+    """Records upserted batches; batches of the failing scope raise once release is set."""
+
+    def __init__(self, failing_scope):
+        self.failing_scope = failing_scope
+        self.release = threading.Event()
+        self.batches = []
+
+    def upsert(self, batch):
+        self.release.wait(5)
+        if batch[0]["payload"].get("scope") == self.failing_scope:
+            raise RuntimeError(f"upsert failed for {self.failing_scope}")
+        self.batches.append(batch)
+
+
+def points(scope, count):
+    return [{"id": f"{scope}-{i}", "vector": np.zeros(4, dtype=np.float32), "payload": {"scope": scope}} for i in range(count)]
+
+
+def test_flush_reports_only_the_scopes_own_errors():
+    store = FailingStore("A")
+    writer = BulkWriter(store, batch_size=2, workers=2, max_pending=1)
+    writer.add(points("A", 2))  # Full batch, submitted in the background
+    store.release.set()
+    writer.add(points("B", 3))  # Backpressure waits on A's batch without taking its error
+
+    writer.flush("B")
+    assert sum(len(batch) for batch in store.batches) == 3
+
+    with pytest.raises(RuntimeError, match="upsert failed for A"):
+        writer.flush("A")
+    writer.flush("A")  # Reported once
+
+
+def test_flush_all_scopes_waits_without_taking_other_errors():
+    store = FailingStore("A")
+    store.release.set()
+    writer = BulkWriter(store, batch_size=10)
+    writer.add(points("A", 1) + points(None, 1))
+
+    writer.flush(all_scopes=True)
+    assert [len(batch) for batch in store.batches] == [1]
+    with pytest.raises(RuntimeError):
+        writer.flush("A")
+
+
+def test_buffered_ids_lists_only_unsubmitted_points():
+    store = FailingStore(None)
+    store.release.set()
+    writer = BulkWriter(store, batch_size=2)
+    writer.add(points("A", 3))  # The first two go out as a batch, the third waits in the buffer
+
+    assert writer.buffered_ids("A") == {"A-2"}
+    assert writer.buffered_ids("B") == set()
+    writer.flush("A")
+    assert writer.buffered_ids("A") == set()
+
+
+def test_backpressure_wait_does_not_hold_the_lock():
+    store = FailingStore(None)
+    writer = BulkWriter(store, batch_size=1, max_pending=1)
+    adder = threading.Thread(target=writer.add, args=(points("A", 2),))  # The second batch waits for the first
+    adder.start()
+    adder.join(0.2)
+    assert adder.is_alive()
+
+    reader = threading.Thread(target=writer.buffered_ids, args=("B",))
+    reader.start()
+    reader.join(1)
+    assert not reader.is_alive()
+
+    store.release.set()
+    adder.join(5)
+    writer.flush("A")
+    assert (writer.requests, writer.points_written) == (2, 2)
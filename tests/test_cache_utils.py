@@ -0,0 +1,15 @@
+from cache_utils import DiskCache
+
+
+def test_running_size_tracks_replace_and_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_entries=3, max_bytes=100)
+    cache.set_many({"a": b"x" * 10, "b": b"y" * 10})
+    cache.set("a", b"z" * 20)  # Replacing an entry swaps its size instead of adding a second one
+    assert (cache.stats()["entries"], cache.stats()["bytes"]) == (2, 30)
+
+    cache.set_many({"c": b"1", "d": b"2", "e": b"3"})
+    assert (cache.stats()["entries"], cache.stats()["bytes"]) == (3, 3)
+    assert cache.get("a") is None
+
+    reopened = DiskCache(str(tmp_path / "cache.sqlite3"), max_entries=3, max_bytes=100)
+    assert (reopened.stats()["entries"], reopened.stats()["bytes"]) == (3, 3)
@@ -0,0 +1,30 @@
+from chunking import iter_page_chunks, iter_text_chunks, iter_transcript_chunks
+
+REPORT = "Investor Update: Q3 2024\n" + "\n".join(
+    f"We closed deal number {i} with the fund and expanded the pipeline this quarter." for i in range(60)
+)
+
+
+def test_report_title_is_not_repeated_on_every_piece():
+    # Extracted PDF text has no blank lines, so the whole report is one oversized unit
+    chunks = list(iter_text_chunks(REPORT, max_tokens=60, overlap_tokens=10))
+    assert len(chunks) > 1
+    assert chunks[0].startswith("Investor Update: Q3 2024\n")
+    assert sum(chunk.count("Investor Update:") for chunk in chunks) == 1
+    # Split on line boundaries, not mid-line
+    assert all(line.startswith(("We closed", "Investor Update")) for chunk in chunks for line in chunk.split("\n"))
+
+
+def test_page_chunks_stay_on_their_page_without_labels():
+    pages = [REPORT, "Appendix: Terms\nThe NDA is attached. " * 20]
+    chunks = list(iter_page_chunks(pages, max_tokens=60, overlap_tokens=10))
+    assert {page for page, _ in chunks} == {1, 2}
+    assert sum(chunk.count("Investor Update:") for _, chunk in chunks) == 1
+    assert all("Investor Update" not in chunk for page, chunk in chunks if page == 2)
+
+
+def test_speaker_turn_label_is_kept_on_every_piece():
+    transcript = {"sentences": [{"speaker_name": "Dana", "text": f"Sentence number {i} about the data room."} for i in range(40)]}
+    chunks = list(iter_transcript_chunks(transcript, max_tokens=60, overlap_tokens=10))
+    assert len(chunks) > 1
+    assert all(line.startswith("Dana: ") for chunk in chunks for line in chunk.split("\n"))
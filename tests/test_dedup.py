@@ -0,0 +1,54 @@
+from dedup import ChunkDeduplicator, simhash
+
+TEXT = (
+    "The investor asked for the signed NDA before the data room opens next week, and the deal team "
+    "agreed to send the quarterly revenue report together with the updated pipeline deck on Friday."
+)
+
+
+def chunk(text, source):
+    return {"text": text}, {"source": source, "metadata": None}
+
+
+def test_exact_duplicates_ignore_case_and_whitespace():
+    deduplicator = ChunkDeduplicator()
+    assert deduplicator.add("a", *chunk("Send the NDA.", "notes"))
+    assert not deduplicator.add("b", *chunk("  send   the nda. ", "report"))
+    assert deduplicator.add("c", *chunk("Send the deck.", "notes"))  # Too short for SimHash; only exact matches
+    assert deduplicator.stats == {"chunks": 3, "unique": 2, "exact_duplicates": 1, "near_duplicates": 0}
+
+
+def test_near_duplicates_within_the_hamming_distance():
+    edited = TEXT.replace("Friday", "Monday")
+    assert bin(simhash(TEXT) ^ simhash(edited)).count("1") <= 7
+
+    deduplicator = ChunkDeduplicator()
+    assert deduplicator.add("a", *chunk(TEXT, "notes"))
+    assert not deduplicator.add("b", *chunk(edited, "report"))
+    assert deduplicator.add("c", *chunk("A completely different paragraph about hiring plans, office moves "
+                                        "and the schedule of the next board meeting in the spring.", "notes"))
+    assert deduplicator.stats["near_duplicates"] == 1
+    assert deduplicator.stats["unique"] == 2
+
+
+def test_survivor_collects_provenance_and_reports_it_once():
+    deduplicator = ChunkDeduplicator()
+    payload, provenance = chunk(TEXT, "notes")
+    deduplicator.add("a", payload, provenance)
+    assert "provenance" not in payload  # A unique chunk carries no provenance list
+    deduplicator.add("b", *chunk(TEXT, "report"))
+    deduplicator.add("c", *chunk(TEXT.upper(), "transcripts"))
+
+    expected = [{"source": source, "metadata": None} for source in ("notes", "report", "transcripts")]
+    assert payload["provenance"] == expected
+    assert deduplicator.pop_dirty() == {"a": expected}
+    assert deduplicator.pop_dirty() == {}
+
+
+def test_encodes_saved_counts_every_dropped_chunk():
+    deduplicator = ChunkDeduplicator()
+    for point_id, text in enumerate([TEXT, TEXT, TEXT.replace("Friday", "Monday"), "Send the NDA.", "send the nda."]):
+        deduplicator.add(str(point_id), *chunk(text, "notes"))
+    report = deduplicator.report()
+    assert (report["exact_duplicates"], report["near_duplicates"], report["unique"]) == (2, 1, 2)
+    assert report["encodes_saved"] == 3
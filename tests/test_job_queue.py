@@ -0,0 +1,55 @@
+import time
+
+from job_queue import JobQueue
+
+
+def test_second_process_does_not_requeue_running_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = JobQueue(path, lease_seconds=60)
+    job_id = first.enqueue("meeting", {"n": 1})
+    assert first.claim()[0] == job_id
+
+    second = JobQueue(path, lease_seconds=60)  # recover() runs on startup
+    assert second.get(job_id)["status"] == "running"
+    assert second.claim() is None
+
+
+def test_expired_lease_is_requeued_and_renew_keeps_it(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2)
+    job_id = queue.enqueue("meeting", {"n": 1})
+    queue.claim()
+    time.sleep(0.15)
+    queue.renew([job_id])
+    time.sleep(0.1)
+    assert queue.claim() is None  # Lease was renewed
+
+    time.sleep(0.25)
+    claimed = queue.claim()  # Lease expired: re-queued and claimed again
+    assert claimed[0] == job_id
+    assert queue.get(job_id)["attempts"] == 2
+
+
+def test_email_marker_covers_reruns_and_retries_of_the_same_event(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=60)
+    first, _ = queue.enqueue_once("meeting", "meeting:done", {"n": 1})
+    assert not queue.email_sent(first["job_id"])
+    queue.claim()
+    queue.mark_email_sent(first["job_id"])
+    assert queue.email_sent(first["job_id"])  # Re-run of the same job after its lease expired
+    queue.fail(first["job_id"], "failed after sending")
+
+    retry, created = queue.enqueue_once("meeting", "meeting:done", {"n": 1})
+    assert created
+    assert queue.email_sent(retry["job_id"])
+
+    other, _ = queue.enqueue_once("other", "other:done", {"n": 1})
+    assert not queue.email_sent(other["job_id"])
+
+
+def test_coalesced_submit_returns_the_existing_jobs_payload(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=60)
+    first, created = queue.enqueue_once("meeting", "meeting:done", {"trace_id": "first"})
+    duplicate, coalesced = queue.enqueue_once("meeting", "meeting:done", {"trace_id": "second"})
+    assert created and not coalesced
+    assert duplicate["job_id"] == first["job_id"]
+    assert duplicate["payload"]["trace_id"] == "first"
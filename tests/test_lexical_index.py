@@ -0,0 +1,45 @@
+import math
+
+import pytest
+
+from lexical_index import BM25Index, query_alternatives, tokenize
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add("draft", "NDA draft", {"scope": "a"})
+    index.add("room", "Data room access", {"scope": "a"})
+    index.add("signed", "NDA, NDA signed", {"scope": "b"})
+    return index
+
+
+def test_tokenize_drops_stopwords_and_splits_hyphens():
+    assert tokenize("The Non-Disclosure Agreement") == ["non", "disclosure", "agreement"]
+    assert query_alternatives("NDA or Non-Disclosure Agreement") == [{"nda"}, {"non", "disclosure", "agreement"}]
+
+
+def test_bm25_scores(index):
+    hits = index.search("nda", top_k=3)
+    assert [hit.id for hit in hits] == ["signed", "draft"]  # Higher term frequency ranks first
+
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+    norm = 1.5 * (1 - 0.75 + 0.75 * 3 / (8 / 3))  # Length 3 against an average of 8/3
+    assert hits[0].score == pytest.approx(idf * 2 * 2.5 / (2 + norm))
+
+
+def test_search_is_restricted_to_scope(index):
+    assert [hit.id for hit in index.search("nda", top_k=3, scope="a")] == ["draft"]
+    assert index.search("data room", top_k=3, scope="b") == []
+
+
+def test_exact_when_one_alternative_is_fully_present(index):
+    hits = {hit.id: hit for hit in index.search("data room or nda signed", top_k=3)}
+    assert hits["room"].exact and hits["signed"].exact
+    assert not hits["draft"].exact  # Has "nda" but not "signed"
+
+
+def test_removed_documents_leave_the_index(index):
+    assert index.remove_scope("b") == 1
+    assert [hit.id for hit in index.search("nda", top_k=3)] == ["draft"]
+    assert len(index) == 2
@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import llm_client
+from llm_client import LLMCache, RateLimiter, chat_completion
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+MESSAGES = [{"role": "user", "content": "Was an NDA mentioned?"}]
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock instead of blocking."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeClient:
+    """OpenAI client whose completions return (or raise) the scripted outcomes in order."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **params):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else f"reply {self.calls}"
+        if isinstance(outcome, Exception):
+            raise outcome
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=2, total_tokens=12)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=outcome))], usage=usage)
+
+
+def api_error(error_class, status, headers=None):
+    return error_class("failed", response=httpx.Response(status, headers=headers, request=REQUEST), body=None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_client, "time", clock)
+    monkeypatch.setattr(llm_client, "rate_limiter", RateLimiter(rpm=1000, tpm=1_000_000))
+    monkeypatch.setattr(llm_client.random, "uniform", lambda low, high: high)  # Longest backoff, no jitter
+    return clock
+
+
+def use_client(monkeypatch, client):
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    return client
+
+
+def test_cache_hit_and_bypass(monkeypatch, tmp_path, clock):
+    monkeypatch.setattr(llm_client, "llm_cache", LLMCache(str(tmp_path / "llm.sqlite3")))
+    client = use_client(monkeypatch, FakeClient())
+
+    first = chat_completion("nda", "gpt-4o", MESSAGES, temperature=0)
+    second = chat_completion("nda", "gpt-4o", MESSAGES, temperature=0)
+    assert (first.content, first.cached) == ("reply 1", False)
+    assert (second.content, second.cached) == ("reply 1", True)
+    assert client.calls == 1
+
+    bypassed = chat_completion("nda", "gpt-4o", MESSAGES, bypass_cache=True, temperature=0)
+    assert (bypassed.content, bypassed.cached) == ("reply 2", False)
+    assert client.calls == 2
+    assert chat_completion("nda", "gpt-4o", MESSAGES, temperature=0).content == "reply 2"  # Bypass refreshed the entry
+    assert llm_client.llm_cache.stats()["call_sites"]["nda"] == {"hits": 2, "misses": 1, "bypassed": 1}
+
+
+def test_limiter_blocks_once_the_budget_is_spent(clock):
+    limiter = RateLimiter(rpm=2, tpm=1000)
+    assert limiter.acquire(100) == 0
+    assert limiter.acquire(100) == 0
+    assert limiter.acquire(100) == pytest.approx(30)  # One request refills every 30s
+    assert clock.sleeps == [pytest.approx(30)]
+
+    limiter = RateLimiter(rpm=1000, tpm=1000)
+    assert limiter.acquire(900) == 0
+    assert limiter.acquire(500) == pytest.approx(24)  # 400 tokens short at 1000 per minute
+    limiter.settle(900, 100)  # Unused estimate goes back to the bucket
+    assert limiter.acquire(100) == 0
+
+
+def test_retries_429_and_5xx_with_backoff(monkeypatch, clock):
+    client = use_client(monkeypatch, FakeClient(
+        api_error(openai.RateLimitError, 429, {"retry-after": "5"}),
+        api_error(openai.InternalServerError, 503),
+        "recovered",
+    ))
+    before = llm_client.llm_client_stats()
+
+    completion = llm_client.create_completion("gpt-4o", MESSAGES)
+    assert completion.choices[0].message.content == "recovered"
+    assert client.calls == 3
+    assert clock.sleeps == [5, 2]  # Retry-After beats the first backoff of 1s; the second backs off 2s
+    stats = llm_client.llm_client_stats()
+    assert stats["retries"] - before["retries"] == 2
+    assert stats["rate_limited"] - before["rate_limited"] == 1
+
+
+def test_gives_up_after_max_retries_and_does_not_retry_client_errors(monkeypatch, clock):
+    monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", 1)
+    client = use_client(monkeypatch, FakeClient(*[api_error(openai.InternalServerError, 500)] * 2))
+    with pytest.raises(openai.InternalServerError):
+        llm_client.create_completion("gpt-4o", MESSAGES)
+    assert client.calls == 2
+
+    client = use_client(monkeypatch, FakeClient(api_error(openai.BadRequestError, 400)))
+    with pytest.raises(openai.BadRequestError):
+        llm_client.create_completion("gpt-4o", MESSAGES)
+    assert client.calls == 1
@@ -0,0 +1,80 @@
+import pytest
+
+from RAG import RAGKBProcessor, reciprocal_rank_fusion
+from vector_store import SearchHit
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    processor = RAGKBProcessor(collection_name="test", vector_backend="numpy", use_embedding_cache=False)
+    upsert = processor.vector_store.upsert
+
+    def failing_upsert(points):
+        if any(point["payload"].get("scope") == "broken" for point in points):
+            raise RuntimeError("upsert failed for broken")
+        upsert(points)
+
+    monkeypatch.setattr(processor.vector_store, "upsert", failing_upsert)
+    return processor
+
+
+def test_unscoped_flush_leaves_other_scopes_errors_to_them(processor):
+    processor.writer.batch_size = 1  # Every point is handed to an upsert right away
+    processor.index_chunks([("board deck and revenue numbers", {"source": "notes"})], scope="broken")
+    # A duplicate leaves provenance to write for a point that is already in flight
+    processor.index_chunks([("board deck and revenue numbers", {"source": "report"})], scope="broken")
+    processor.index_chunks([("send the nda before the call", {"source": "notes"})], scope="ok")
+
+    processor.flush()  # Waits for every scope without raising theirs
+    processor.flush("ok")
+    with pytest.raises(RuntimeError, match="broken"):
+        processor.flush("broken")
+
+
+class FakePage:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+
+def test_folder_manifest_and_counts_are_per_scope(processor, monkeypatch, tmp_path):
+    monkeypatch.setattr("RAG.PdfReader", lambda path: type("Reader", (), {"pages": [FakePage("quarterly pricing terms")]}))
+    (tmp_path / "terms.pdf").write_bytes(b"%PDF")
+    document = str((tmp_path / "terms.pdf").resolve())
+
+    processor.process_pdfs_in_folder(str(tmp_path), scope="a", workers=1)
+    processor.process_pdfs_in_folder(str(tmp_path), scope="b", workers=1)  # Unchanged file, but not yet in scope b
+    assert processor.vector_store.count_by_field("document", document, "a") == 1
+    assert processor.vector_store.count_by_field("document", document, "b") == 1
+    assert processor.vector_store.count_by_field("document", document) == 0
+
+    processor.delete_by_field("document", document, "a")
+    assert processor.vector_store.count_by_field("document", document, "a") == 0
+    assert processor.vector_store.count_by_field("document", document, "b") == 1
+
+
+def test_reciprocal_rank_fusion_orders_by_summed_reciprocal_ranks():
+    dense = [SearchHit(point_id, 0.0, {}) for point_id in ("a", "b", "c")]
+    lexical = [SearchHit(point_id, 0.0, {}) for point_id in ("c", "a")]
+    fused = reciprocal_rank_fusion([dense, lexical], k=60)
+    assert [hit.id for hit in fused] == ["a", "c", "b"]
+    assert fused[0].score == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_exact_lexical_matches_skip_the_dense_search(processor, monkeypatch):
+    processor.index_chunks([("data room access link", {"source": "notes"})], scope="ok")
+    processor.index_chunks([("data room for another deal", {"source": "notes"})], scope="other")
+    searches = []
+    search_batch = processor.vector_store.search_batch
+    monkeypatch.setattr(
+        processor.vector_store, "search_batch", lambda *args, **kwargs: searches.append(args) or search_batch(*args, **kwargs)
+    )
+
+    contexts = processor.search_context("data room", top_k=1, scope="ok", mode="hybrid")
+    assert [context["text"] for context in contexts] == ["data room access link"]
+    assert searches == []
+
+    processor.search_context("data room", top_k=2, scope="ok", mode="hybrid")  # Too few exact hits
+    assert len(searches) == 1
@@ -0,0 +1,96 @@
+import pytest
+
+import report_fetcher
+from report_fetcher import ReportFetcher, ReportTooLarge
+
+URL = "https://reports.example.com/q3.pdf"
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+
+class FakeSession:
+    """Returns the queued responses in order and records the headers of every request."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def fetcher(monkeypatch, tmp_path):
+    extractions = []
+    monkeypatch.setattr(
+        report_fetcher, "extract_pdf_pages", lambda data: extractions.append(data) or [data.decode(), "page 2"]
+    )
+    fetcher = ReportFetcher(cache_path=str(tmp_path / "reports.sqlite3"), max_bytes=1024)
+    fetcher.extractions = extractions
+    return fetcher
+
+
+def test_revalidates_with_etag_and_last_modified_and_reuses_text_on_304(fetcher):
+    headers = {"ETag": '"v1"', "Last-Modified": "Wed, 01 Oct 2025 10:00:00 GMT"}
+    fetcher.session = FakeSession(FakeResponse(200, b"report v1", headers), FakeResponse(304))
+
+    assert fetcher.fetch_pages(URL) == ["report v1", "page 2"]
+    assert fetcher.fetch_pages(URL) == ["report v1", "page 2"]
+    assert fetcher.session.requests == [
+        {}, {"If-None-Match": '"v1"', "If-Modified-Since": "Wed, 01 Oct 2025 10:00:00 GMT"}
+    ]
+    assert len(fetcher.extractions) == 1
+    assert (fetcher.stats["downloads"], fetcher.stats["not_modified"]) == (1, 1)
+
+
+def test_identical_body_is_not_extracted_again_and_changed_body_is(fetcher):
+    fetcher.session = FakeSession(
+        FakeResponse(200, b"report v1", {"ETag": '"v1"'}),
+        FakeResponse(200, b"report v1", {"ETag": '"v2"'}),  # Server ignored the validator
+        FakeResponse(200, b"report v3", {"ETag": '"v3"'}),
+    )
+    fetcher.fetch_pages(URL)
+    fetcher.fetch_pages(URL)
+    assert fetcher.fetch_pages(URL) == ["report v3", "page 2"]
+    assert fetcher.session.requests[2] == {"If-None-Match": '"v2"'}
+    assert len(fetcher.extractions) == 2
+    assert fetcher.stats["unchanged"] == 1
+
+
+def test_errors_raise_and_leave_the_cached_report_usable(fetcher):
+    fetcher.session = FakeSession(
+        FakeResponse(200, b"report v1", {"ETag": '"v1"'}),
+        FakeResponse(503),
+        FakeResponse(200, b"x" * 2048),
+        FakeResponse(304),
+    )
+    fetcher.fetch_pages(URL)
+    with pytest.raises(Exception, match="503"):
+        fetcher.fetch_pages(URL)
+    with pytest.raises(ReportTooLarge):
+        fetcher.fetch_pages(URL)
+
+    assert fetcher.fetch_pages(URL) == ["report v1", "page 2"]  # Still revalidated against the first download
+    assert fetcher.session.requests[3] == {"If-None-Match": '"v1"'}
+
+
+def test_304_without_a_cached_report_is_an_error(fetcher):
+    fetcher.session = FakeSession(FakeResponse(304))
+    with pytest.raises(Exception, match="304"):
+        fetcher.fetch_pages(URL)
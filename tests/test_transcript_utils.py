@@ -0,0 +1,64 @@
+import pytest
+
+from transcript_utils import CompactTranscript, get_transcript_speakers, process_transcript_content
+
+
+def previous_rendering(transcript):
+    """process_transcript_content before transcripts were compacted: string concatenation per sentence."""
+    content = "\n\nTranscript:\n"
+    for sentence in transcript.get('sentences', []):
+        speaker = sentence.get('speaker_name', 'Unknown Speaker')
+        text = sentence.get('text', '')
+        content += f"{speaker}: {text}\n\n"
+    return content
+
+
+def previous_speakers(transcript):
+    speakers = []
+    for sentence in transcript.get('sentences', []):
+        speaker = sentence.get('speaker_name', 'Unknown Speaker')
+        if speaker not in speakers:
+            speakers.append(speaker)
+    return speakers
+
+
+TRANSCRIPTS = [
+    {"id": "empty", "sentences": []},
+    {"id": "one", "sentences": [{"speaker_name": "Kyle", "text": "Hi all."}]},
+    {"id": "mixed", "sentences": [
+        {"speaker_name": "Kyle", "text": "Let's start."},
+        {"speaker_name": "Kyle", "text": ""},
+        {"speaker_name": "Dana Whitfield", "text": "Can you send the NDA?"},
+        {"text": "Unattributed line."},
+        {"speaker_name": "Kyle", "text": "Sure, today."},
+        {"speaker_name": "Dana Whitfield"},
+        {"speaker_name": "Marco Ruiz", "text": None},
+        {"speaker_name": "Dana Whitfield", "text": 42},
+    ]},
+]
+
+
+@pytest.mark.parametrize("transcript", TRANSCRIPTS, ids=lambda transcript: transcript["id"])
+def test_rendering_and_speakers_match_the_previous_implementation(transcript):
+    assert process_transcript_content(transcript) == previous_rendering(transcript)
+    assert get_transcript_speakers(transcript) == previous_speakers(transcript)
+
+
+def test_speaker_table_and_turns():
+    compact = CompactTranscript.from_fireflies(TRANSCRIPTS[2])
+    assert compact.speakers == ["Kyle", "Dana Whitfield", "Unknown Speaker", "Marco Ruiz"]
+    assert list(compact.speaker_ids) == [0, 0, 1, 2, 0, 1, 3, 1]
+    assert list(compact.iter_turns()) == [
+        "Kyle: Let's start. ",
+        "Dana Whitfield: Can you send the NDA?",
+        "Unknown Speaker: Unattributed line.",
+        "Kyle: Sure, today.",
+        "Dana Whitfield: ",
+        "Marco Ruiz: None",
+        "Dana Whitfield: 42",
+    ]
+
+
+def test_missing_sentences_render_an_empty_transcript():
+    assert process_transcript_content({"sentences": None}) == "\n\nTranscript:\n"
+    assert len(CompactTranscript.from_fireflies({})) == 0
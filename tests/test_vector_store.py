@@ -0,0 +1,26 @@
+import numpy as np
+
+from vector_store import NumpyVectorStore
+
+
+def points(scope, vectors):
+    return [
+        {"id": f"{scope}-{i}", "vector": vector, "payload": {"scope": scope}}
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def test_rescored_search_keeps_originals_aligned_after_delete():
+    rng = np.random.default_rng(0)
+    store = NumpyVectorStore("test", initial_capacity=4, precision="int8", rescore=True)
+    store.upsert(points("A", rng.standard_normal((8, 16)).astype(np.float32)))
+    kept = rng.standard_normal((8, 16)).astype(np.float32)
+    store.upsert(points("B", kept))
+
+    store.delete_scope("A")
+    assert store.memory_bytes() == 8 * (16 + 4 + 16 * 4)
+
+    query = kept[5]
+    hit = store.search(query, 1, scope="B")[0]
+    assert hit.id == "B-5"
+    assert abs(hit.score - 1.0) < 1e-5  # Scored against the float32 original, not the int8 row
@@ -1,10 +1,13 @@
 import requests
-import openai
 import logging
 import re
 import os
+import threading
+from array import array
 from fpdf import FPDF
 from dotenv import load_dotenv
+from llm_client import chat_completion
+from prompt_budget import TRIAGE_CONTEXT_TOKENS, truncate_tokens
 
 # Load environment variables
 load_dotenv()
@@ -72,30 +75,85 @@ def fetch_transcript_details(meeting_id, api_key):
         return None
 
 
+class CompactTranscript:
+    """
+    Fireflies transcript normalized in a single pass over its sentences.
+    Speaker names are interned in a table (first appearance order) and each sentence is stored as
+    a speaker index in an array plus its text, shared with the API response rather than copied.
+    turn_starts holds the index of the first sentence of each speaker turn.
+    """
+    __slots__ = ("id", "title", "date", "speakers", "speaker_ids", "texts", "turn_starts")
+
+    def __init__(self, transcript_id=None, title=None, date=None):
+        self.id = transcript_id
+        self.title = title
+        self.date = date
+        self.speakers = []
+        self.speaker_ids = array("I")
+        self.texts = []
+        self.turn_starts = array("I")
+
+    @classmethod
+    def from_fireflies(cls, transcript):
+        compact = cls(transcript.get('id'), transcript.get('title'), transcript.get('date'))
+        index = {}
+        speakers, speaker_ids, texts, turn_starts = compact.speakers, compact.speaker_ids, compact.texts, compact.turn_starts
+        previous = None
+        for position, sentence in enumerate(transcript.get('sentences') or []):
+            speaker = sentence.get('speaker_name', 'Unknown Speaker')
+            speaker_id = index.get(speaker)
+            if speaker_id is None:
+                speaker_id = index[speaker] = len(speakers)
+                speakers.append(speaker)
+            if speaker_id != previous:
+                turn_starts.append(position)
+                previous = speaker_id
+            speaker_ids.append(speaker_id)
+            text = sentence.get('text', '')
+            texts.append(text if isinstance(text, str) else str(text))
+        return compact
+
+    def __len__(self):
+        return len(self.texts)
+
+    def render(self):
+        """The transcript as "Speaker: text" paragraphs, one per sentence, joined once."""
+        prefixes = [f"{speaker}: " for speaker in self.speakers]
+        parts = ["\n\nTranscript:\n"]
+        append = parts.append
+        for speaker_id, text in zip(self.speaker_ids, self.texts):
+            append(prefixes[speaker_id])
+            append(text)
+            append("\n\n")
+        return "".join(parts)
+
+    def iter_turns(self):
+        """Yield one "Speaker: text" unit per run of consecutive sentences by the same speaker."""
+        ends = list(self.turn_starts[1:]) + [len(self.texts)]
+        for start, end in zip(self.turn_starts, ends):
+            yield f"{self.speakers[self.speaker_ids[start]]}: " + " ".join(self.texts[start:end])
+
+
+def compact_transcript(transcript):
+    """Return transcript as a CompactTranscript, normalizing a Fireflies response if needed."""
+    if isinstance(transcript, CompactTranscript):
+        return transcript
+    return CompactTranscript.from_fireflies(transcript)
+
+
 def process_transcript_content(transcript):
     """
     Process transcript sentences into readable format.
     """
-    sentences = transcript.get('sentences', [])
-    content = "\n\nTranscript:\n" 
-    for sentence in sentences:
-        speaker = sentence.get('speaker_name', 'Unknown Speaker')
-        text = sentence.get('text', '')
-        content += f"{speaker}: {text}\n\n"
-    return content
+    return compact_transcript(transcript).render()
 
 def get_transcript_speakers(transcript):
-    sentences = transcript.get('sentences', [])
-    speakers = []
-    for sentence in sentences:
-        speaker = sentence.get('speaker_name', 'Unknown Speaker')
-        if speaker not in speakers:
-            speakers.append(speaker)
-    return speakers
-
-def save_transcript_as_pdf(transcript_details, content):
+    return list(compact_transcript(transcript).speakers)
+
+def save_transcript_as_pdf(transcript_details, content, file_path=None):
     """
-    Save transcript details and content into a PDF file.
+    Save transcript details and content into a PDF file (transcripts/<title>.pdf unless file_path is given).
+    The file is written under a temporary name and moved into place, so it is never read half-written.
     """
     pdf = FPDF()
     pdf.add_page()
@@ -112,14 +170,16 @@ def save_transcript_as_pdf(transcript_details, content):
     pdf.cell(200, 10, txt="Transcript Content:", ln=True)
     pdf.multi_cell(0, 10, txt=content)
 
-    filename = f"{title.replace(' ', '_')}.pdf"
-    os.makedirs("transcripts", exist_ok=True)
-    file_path = os.path.join("transcripts", filename)
-    pdf.output(file_path)
+    if file_path is None:
+        file_path = os.path.join("transcripts", f"{title.replace(' ', '_')}.pdf")
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pdf.output(temp_path)
+    os.replace(temp_path, file_path)
     return file_path
 
 
-def analyze_transcript_with_gpt(content, title):
+def analyze_transcript_with_gpt(content, title, bypass_cache=False):
     """
     Use GPT-4 to determine whether the meeting is worthwhile.
     """
@@ -131,22 +191,23 @@ def analyze_transcript_with_gpt(content, title):
     prompt = f"""
     Analyze the following meeting transcript to determine if it is a worthwhile investor-client meeting.
     Transcript:
-    {content[:4000]}  
+    {truncate_tokens(content, TRIAGE_CONTEXT_TOKENS)}  
 
     Guidelines:
     - Return "YES" if it is a worthwhile investor-client meeting.
     - Return "NO" if it is internal or unrelated.
     """
     try:
-        client = openai.Client()
-        response = client.chat.completions.create(
+        response = chat_completion(
+            "analyze_transcript_with_gpt",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an AI assistant analyzing transcripts."},
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            bypass_cache=bypass_cache
         )
-        analysis = response.choices[0].message.content.strip()
+        analysis = response.content.strip()
         if "YES" in analysis.upper():
             logging.info("Rule 2 Passed: GPT analysis deemed the meeting worthwhile.")
             return True, analysis
@@ -0,0 +1,527 @@
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    PointStruct, VectorParams, Distance, Filter, FieldCondition, MatchValue, Range, FilterSelector, PayloadSchemaType,
+    SearchRequest, Datatype, ScalarQuantization, ScalarQuantizationConfig, ScalarType, SearchParams,
+    QuantizationSearchParams, SetPayload, SetPayloadOperation, IsEmptyCondition, PayloadField
+)
+
+# Backend-neutral search result
+SearchHit = namedtuple("SearchHit", ["id", "score", "payload"])
+
+# Stored vector precision: "float32", "float16", or "int8" (scalar quantized)
+PRECISIONS = ("float32", "float16", "int8")
+# Quantized search fetches this many candidates per result, then rescores them at full precision
+RESCORE_OVERSAMPLING = 4
+
+
+class QdrantVectorStore:
+    """
+    Vector store backed by a Qdrant collection.
+    Points are dicts with "id", "vector" and "payload" keys.
+    """
+
+    def __init__(self, collection_name, url="http://localhost:6333", precision="float32", rescore=True):
+        self.collection_name = collection_name
+        self.client = QdrantClient(url=url)  # Connect to Qdrant
+        self.precision = precision
+        self.rescore = rescore
+        self.search_params = None
+        if precision == "int8":
+            self.search_params = SearchParams(
+                quantization=QuantizationSearchParams(rescore=rescore, oversampling=float(RESCORE_OVERSAMPLING))
+            )
+
+    def recreate(self, vector_size):
+        """
+        Delete and recreate the collection.
+        """
+        try:
+            # Delete existing collection
+            self.client.delete_collection(collection_name=self.collection_name)
+            logging.info(f"Deleted existing collection: {self.collection_name}")
+        except Exception as e:
+            logging.warning(f"Collection {self.collection_name} does not exist. Proceeding to create it.")
+
+        # Recreate the collection. int8 keeps quantized vectors in RAM and the originals on disk for rescoring.
+        vectors_config = VectorParams(size=vector_size, distance=Distance.COSINE)
+        quantization_config = None
+        if self.precision == "float16":
+            vectors_config = VectorParams(size=vector_size, distance=Distance.COSINE, datatype=Datatype.FLOAT16)
+        elif self.precision == "int8":
+            vectors_config = VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=True)
+            quantization_config = ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        self.client.recreate_collection(
+            collection_name=self.collection_name,
+            vectors_config=vectors_config,
+            quantization_config=quantization_config,
+        )
+        logging.info(f"Recreated collection: {self.collection_name}")
+
+        # Index the scope fields so filtered search and GC stay cheap
+        self.client.create_payload_index(
+            collection_name=self.collection_name, field_name="scope", field_schema=PayloadSchemaType.KEYWORD
+        )
+        self.client.create_payload_index(
+            collection_name=self.collection_name, field_name="expires_at", field_schema=PayloadSchemaType.FLOAT
+        )
+        self.client.create_payload_index(
+            collection_name=self.collection_name, field_name="document", field_schema=PayloadSchemaType.KEYWORD
+        )
+
+    def ensure(self, vector_size):
+        """
+        Create the collection unless it already exists; points other processes indexed are kept.
+        """
+        if self.client.collection_exists(collection_name=self.collection_name):
+            logging.info(f"Using existing collection: {self.collection_name}")
+            return
+        self.recreate(vector_size)
+
+    def field_filter(self, field, value):
+        return Filter(must=[FieldCondition(key=field, match=MatchValue(value=value))])
+
+    def scope_filter(self, scope):
+        if scope is None:
+            return None
+        return self.field_filter("scope", scope)
+
+    def scoped_field_filter(self, field, value, scope):
+        """Points of exactly scope (points without a scope when None) whose field equals value."""
+        if scope is None:
+            scope_condition = IsEmptyCondition(is_empty=PayloadField(key="scope"))
+        else:
+            scope_condition = FieldCondition(key="scope", match=MatchValue(value=scope))
+        return Filter(must=[FieldCondition(key=field, match=MatchValue(value=value)), scope_condition])
+
+    def upsert(self, points):
+        if not points:
+            return
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                PointStruct(id=point["id"], vector=np.asarray(point["vector"]).tolist(), payload=point["payload"])
+                for point in points
+            ],
+        )
+
+    def search(self, vector, top_k, scope=None):
+        results = self.client.search(
+            collection_name=self.collection_name,
+            query_vector=np.asarray(vector).tolist(),
+            query_filter=self.scope_filter(scope),
+            search_params=self.search_params,
+            limit=top_k,
+        )
+        return [SearchHit(result.id, result.score, result.payload) for result in results]
+
+    def search_batch(self, vectors, top_k, scope=None):
+        query_filter = self.scope_filter(scope)
+        batch_results = self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                SearchRequest(
+                    vector=np.asarray(vector).tolist(),
+                    filter=query_filter,
+                    params=self.search_params,
+                    limit=top_k,
+                    with_payload=True,
+                )
+                for vector in vectors
+            ],
+        )
+        return [
+            [SearchHit(result.id, result.score, result.payload) for result in results]
+            for results in batch_results
+        ]
+
+    def delete_scope(self, scope):
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=self.scope_filter(scope)),
+        )
+
+    def set_payload(self, point_id, payload):
+        """Merge payload into an existing point's payload."""
+        self.client.set_payload(collection_name=self.collection_name, payload=payload, points=[point_id])
+
+    def set_payloads(self, payloads):
+        """Merge {point id: payload} into existing points in one batched request."""
+        self.client.batch_update_points(
+            collection_name=self.collection_name,
+            update_operations=[
+                SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id]))
+                for point_id, payload in payloads.items()
+            ],
+        )
+
+    def delete_by_field(self, field, value, scope=None):
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=self.scoped_field_filter(field, value, scope)),
+        )
+
+    def count_by_field(self, field, value, scope=None):
+        return self.client.count(
+            collection_name=self.collection_name, count_filter=self.scoped_field_filter(field, value, scope), exact=False
+        ).count
+
+    def delete_expired(self, now=None):
+        now = time.time() if now is None else now
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=Filter(must=[
+                FieldCondition(key="expires_at", range=Range(lt=now))
+            ])),
+        )
+
+
+class NumpyVectorStore:
+    """
+    In-process vector store for small per-request corpora.
+    Vectors are kept L2-normalized in one matrix, so cosine similarity is a single matrix product.
+
+    The matrix can be stored as float16, or as int8 with a per-vector scale (scalar quantization).
+    With rescore the float32 originals are kept in a second matrix (rows deleted along with the
+    quantized ones), and the top candidates of a quantized search are rescored at full precision;
+    the originals alone take as much memory as float32 storage, so rescoring is off by default.
+    """
+
+    def __init__(self, collection_name, initial_capacity=1024, precision="float32", rescore=False):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector precision: {precision}")
+        self.collection_name = collection_name
+        self.initial_capacity = initial_capacity
+        self.precision = precision
+        self.rescore = rescore and precision != "float32"
+        self._lock = threading.RLock()
+        self.recreate(0)
+
+    def recreate(self, vector_size):
+        with self._lock:
+            self.vector_size = vector_size
+            self._matrix = np.empty((self.initial_capacity, vector_size), dtype=self.precision)
+            self._scales = np.ones(self.initial_capacity, dtype=np.float32)
+            self._originals = np.empty((self.initial_capacity if self.rescore else 0, vector_size), dtype=np.float32)
+            self._expires_at = np.empty(self.initial_capacity, dtype=np.float64)
+            self._scope_codes = np.empty(self.initial_capacity, dtype=np.int32)
+            self._ids = []
+            self._payloads = []
+            self._positions = {}  # point id -> row
+            self._scopes = {None: -1}  # scope -> code
+            self._next_scope_code = 0
+            self._size = 0
+        logging.info(f"Recreated in-memory collection: {self.collection_name}")
+
+    def ensure(self, vector_size):
+        """Size the collection for vector_size unless it already holds points."""
+        with self._lock:
+            if self.vector_size != vector_size and not self._size:
+                self.recreate(vector_size)
+
+    def _grow(self, needed):
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_matrix", "_scales", "_expires_at", "_scope_codes") + (("_originals",) if self.rescore else ()):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _scope_code(self, scope):
+        if scope not in self._scopes:
+            self._scopes[scope] = self._next_scope_code
+            self._next_scope_code += 1
+        return self._scopes[scope]
+
+    def _quantize(self, vectors):
+        """Return (stored vectors, per-vector scales) for normalized float32 vectors."""
+        if self.precision == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(self.precision), np.ones(len(vectors), dtype=np.float32)
+
+    def memory_bytes(self):
+        """Bytes held by the stored vectors, including rescoring originals (excluding payloads)."""
+        row_bytes = self._matrix.shape[1] * self._matrix.itemsize + self._scales.itemsize
+        if self.rescore:
+            row_bytes += self._originals.shape[1] * self._originals.itemsize
+        return self._size * row_bytes
+
+    def upsert(self, points):
+        if not points:
+            return
+        vectors = np.asarray([point["vector"] for point in points], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        stored, scales = self._quantize(vectors)
+
+        with self._lock:
+            if self._matrix.shape[1] != vectors.shape[1]:
+                if self._size:
+                    raise ValueError(f"Expected vectors of size {self._matrix.shape[1]}, got {vectors.shape[1]}")
+                self.recreate(vectors.shape[1])
+            self._grow(self._size + len(points))
+            for point, original, vector, scale in zip(points, vectors, stored, scales):
+                payload = point["payload"]
+                row = self._positions.get(point["id"])
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._positions[point["id"]] = row
+                    self._ids.append(point["id"])
+                    self._payloads.append(payload)
+                else:
+                    self._payloads[row] = payload
+                self._matrix[row] = vector
+                self._scales[row] = scale
+                if self.rescore:
+                    self._originals[row] = original
+                self._expires_at[row] = payload.get("expires_at", np.inf)
+                self._scope_codes[row] = self._scope_code(payload.get("scope"))
+
+    def _top_k(self, scores, top_k):
+        if len(scores) > top_k:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(candidate, scores[candidate]) for candidate in candidates if np.isfinite(scores[candidate])]
+
+    def search(self, vector, top_k, scope=None):
+        return self.search_batch([vector], top_k, scope)[0]
+
+    def search_batch(self, vectors, top_k, scope=None):
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            if self._size == 0 or top_k <= 0:
+                return [[] for _ in queries]
+            matrix = self._matrix[:self._size]
+            if self.precision == "float32":
+                scores = queries @ matrix.T
+            else:
+                scores = (queries @ matrix.T.astype(np.float32)) * self._scales[:self._size]
+            if scope is not None:
+                code = self._scopes.get(scope)
+                scores[:, self._scope_codes[:self._size] != code] = -np.inf
+
+            if not self.rescore:
+                return [
+                    [SearchHit(self._ids[row], float(score), self._payloads[row]) for row, score in self._top_k(row_scores, top_k)]
+                    for row_scores in scores
+                ]
+
+            # Rescore the oversampled candidates against the full-precision originals
+            results = []
+            for query, row_scores in zip(queries, scores):
+                rows = [row for row, _ in self._top_k(row_scores, top_k * RESCORE_OVERSAMPLING)]
+                rescored = self._originals[rows] @ query if rows else np.empty(0, dtype=np.float32)
+                results.append([
+                    SearchHit(self._ids[rows[i]], float(rescored[i]), self._payloads[rows[i]])
+                    for i in np.argsort(-rescored)[:top_k]
+                ])
+            return results
+
+    def _delete_rows(self, mask):
+        with self._lock:
+            if not mask.any():
+                return
+            keep = np.flatnonzero(~mask)
+            size = len(keep)
+            self._matrix[:size] = self._matrix[keep]
+            self._scales[:size] = self._scales[keep]
+            if self.rescore:
+                self._originals[:size] = self._originals[keep]
+            self._expires_at[:size] = self._expires_at[keep]
+            self._scope_codes[:size] = self._scope_codes[keep]
+            self._ids = [self._ids[row] for row in keep]
+            self._payloads = [self._payloads[row] for row in keep]
+            self._positions = {point_id: row for row, point_id in enumerate(self._ids)}
+            self._size = size
+
+    def delete_scope(self, scope):
+        with self._lock:
+            code = self._scopes.get(scope)
+            if code is None:
+                return
+            self._delete_rows(self._scope_codes[:self._size] == code)
+            del self._scopes[scope]
+
+    def _field_mask(self, field, value, scope=None):
+        """Rows of exactly scope (unscoped rows when None) whose field equals value."""
+        code = self._scopes.get(scope)
+        if code is None:
+            return np.zeros(self._size, dtype=bool)
+        return np.fromiter(
+            (payload.get(field) == value for payload in self._payloads), dtype=bool, count=self._size
+        ) & (self._scope_codes[:self._size] == code)
+
+    def set_payload(self, point_id, payload):
+        """Merge payload into an existing point's payload."""
+        with self._lock:
+            row = self._positions.get(point_id)
+            if row is not None:
+                self._payloads[row].update(payload)
+
+    def set_payloads(self, payloads):
+        """Merge {point id: payload} into existing points."""
+        with self._lock:
+            for point_id, payload in payloads.items():
+                row = self._positions.get(point_id)
+                if row is not None:
+                    self._payloads[row].update(payload)
+
+    def delete_by_field(self, field, value, scope=None):
+        with self._lock:
+            self._delete_rows(self._field_mask(field, value, scope))
+
+    def count_by_field(self, field, value, scope=None):
+        with self._lock:
+            return int(self._field_mask(field, value, scope).sum())
+
+    def delete_expired(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._delete_rows(self._expires_at[:self._size] < now)
+            live = set(self._scope_codes[:self._size].tolist())
+            self._scopes = {scope: code for scope, code in self._scopes.items() if scope is None or code in live}
+
+
+class BulkWriter:
+    """
+    Buffers points and upserts them to a store in bulk on background threads.
+    A batch is flushed once it reaches batch_size points or max_bytes, so the caller can keep
+    embedding the next batch while the previous one is written.
+    Points are batched per scope (payload "scope") and each scope's batches and failures are tracked
+    separately, so concurrent jobs only wait on, and only see errors from, their own writes.
+    Call flush(scope) as a barrier before searching or deleting.
+    """
+
+    def __init__(self, store, batch_size=256, max_bytes=4 * 1024 * 1024, workers=1, max_pending=4):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.requests = 0
+        self.points_written = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-writer")
+        self._lock = threading.Lock()
+        self._capacity = threading.Condition(self._lock)  # Signalled whenever a running batch finishes
+        self._running = 0
+        self._buffers = {}  # scope -> [points, bytes]
+        self._pending = {}  # scope -> deque of batch futures not yet reported to a flush
+
+    def _size_of(self, point):
+        text = point["payload"].get("text") or ""
+        return np.asarray(point["vector"]).nbytes + len(text) + 256  # Rough payload overhead
+
+    def add(self, points):
+        """Buffer points, flushing full batches in the background."""
+        with self._lock:
+            for point in points:
+                scope = point["payload"].get("scope")
+                buffer = self._buffers.setdefault(scope, [[], 0])
+                buffer[0].append(point)
+                buffer[1] += self._size_of(point)
+                if len(buffer[0]) >= self.batch_size or buffer[1] >= self.max_bytes:
+                    self._submit(scope)
+
+    def _submit(self, scope):
+        buffer = self._buffers.pop(scope, None)
+        if not buffer or not buffer[0]:
+            return
+        # Successful batches need no reporting; keep only unfinished and failed ones. Finished batches stay
+        # with their scope until it flushes, so a failure is reported to the scope that wrote it.
+        for pending_scope in list(self._pending):
+            futures = deque(future for future in self._pending[pending_scope]
+                            if not future.done() or future.exception() is not None)
+            if futures:
+                self._pending[pending_scope] = futures
+            else:
+                del self._pending[pending_scope]
+        # The batch is pending for its scope before it waits, so a concurrent flush of the scope waits for it too
+        future = Future()
+        self._pending.setdefault(scope, deque()).append(future)
+        # Backpressure: don't let more than max_pending batches run at once. Waiting releases the lock,
+        # so other scopes keep buffering and flushing meanwhile.
+        while self._running >= self.max_pending:
+            self._capacity.wait()
+        self._running += 1
+        self._executor.submit(self._write, buffer[0], future)
+
+    def _write(self, batch, future):
+        try:
+            self.store.upsert(batch)
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        with self._capacity:
+            self._running -= 1
+            if error is None:
+                self.requests += 1
+                self.points_written += len(batch)
+            self._capacity.notify_all()
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+    def buffered_ids(self, scope=None):
+        """Ids of scope's points still waiting in the buffer, i.e. not yet handed to an upsert."""
+        with self._lock:
+            buffer = self._buffers.get(scope)
+            return {point["id"] for point in buffer[0]} if buffer else set()
+
+    def flush(self, scope=None, all_scopes=False):
+        """
+        Write the buffered points of scope and wait until its pending batches are stored.
+        Raises the first error among that scope's failed batches.
+        With all_scopes, every other scope's points are written and waited for too, but their
+        errors are left to be reported to their own scope.
+        """
+        with self._lock:
+            scopes = set(self._buffers) | set(self._pending) | {scope} if all_scopes else {scope}
+            for flushed in scopes:
+                self._submit(flushed)
+            owned = list(self._pending.pop(scope, ()))
+            others = [future for futures in self._pending.values() for future in futures] if all_scopes else []
+        wait(others)
+        errors = []
+        for future in owned:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            logging.error(f"{len(errors)} bulk upserts failed: {errors[0]}")
+            raise errors[0]
+
+
+def make_vector_store(backend, collection_name, precision="float32", rescore=None):
+    """
+    Build the vector store for backend ("qdrant" or "numpy") storing vectors at precision.
+    With rescore, quantized search re-ranks its top candidates at full precision. Qdrant keeps the
+    originals on disk itself and rescores by default; the numpy store would keep a float32 copy in
+    memory next to each quantized vector (more than float32 storage alone), so it doesn't by default.
+    """
+    if backend == "qdrant":
+        return QdrantVectorStore(collection_name, precision=precision, rescore=True if rescore is None else rescore)
+    if backend == "numpy":
+        return NumpyVectorStore(collection_name, precision=precision, rescore=bool(rescore))
+    raise ValueError(f"Unknown vector store backend: {backend}")